@@ -13,6 +13,8 @@ test_fval_function = True
 test_anytime_gbfs = True
 test_alternate = True
 test_anytime_weighted_astar = True
+test_batch_heuristic = True
+test_perimeter_costbound = True
 
 TIMEOUT = 5 #timeout to impose
 
@@ -201,3 +203,62 @@ if __name__ == '__main__':
     print("The benchmark implementation solved {} out of the 20 practice problems given {} seconds.".format(15, timebound))
     print("*************************************\n")
     ##############################################################
+
+  if test_batch_heuristic:
+
+    ##############################################################
+    # TEST BATCH HEURISTIC
+    # A batch heuristic must not change the cost of the solutions found by breadth_first (which doesn't use
+    # heuristic values) or by astar with an admissible heuristic.
+    print('Testing batch heuristic')
+
+    solved = 0; unsolved = []; timebound = TIMEOUT #time limit
+    problems = [2, 6, 7]
+    for strategy in ['breadth_first', 'astar']:
+      for i in problems:
+        costs = []
+        for heur_batch_fn in [None, heur_manhattan_distance_batch]:
+          se = SearchEngine(strategy, 'full')
+          se.init_search(PROBLEMS[i], goal_fn=snowman_goal_state, heur_fn=heur_manhattan_distance, heur_batch_fn=heur_batch_fn)
+          final = se.search(timebound)
+          costs.append(final.gval if final else None)
+        print('{} problem {}: cost {} without and {} with the batch heuristic'.format(strategy, i, costs[0], costs[1]))
+        if costs[0] is not None and costs[0] == costs[1]:
+          solved += 1
+        else:
+          unsolved.append((strategy, i))
+
+    print("\n*************************************")
+    print("The batch heuristic left the solution cost unchanged in {} out of {} tests.".format(solved, 2 * len(problems)))
+    print("Tests that failed: {}".format(unsolved))
+    print("*************************************\n")
+    ##############################################################
+
+  if test_perimeter_costbound:
+
+    ##############################################################
+    # TEST PERIMETER SEARCH WITH A COSTBOUND
+    # A state on the perimeter only counts as a goal if the solution completed from it is within the costbound,
+    # so a bound below the optimal cost (22 for problem 7) must find nothing, as it does without a perimeter.
+    print('Testing perimeter search with a costbound')
+
+    solved = 0; unsolved = []; timebound = TIMEOUT #time limit
+    tests = [(None, 22), ((21, float('inf'), float('inf')), False), ((float('inf'), float('inf'), 21), False), ((22, float('inf'), float('inf')), 22)]
+    for strategy in ['astar', 'best_first']:
+      for costbound, correct in tests:
+        se = SearchEngine(strategy, 'full')
+        se.set_perimeter(5)
+        se.init_search(PROBLEMS[7], goal_fn=snowman_goal_state, heur_fn=heur_manhattan_distance)
+        final = se.search(timebound, costbound)
+        cost = final.gval if final else False
+        print('{} with costbound {}: found {}, correct {}'.format(strategy, costbound, cost, correct))
+        if cost == correct:
+          solved += 1
+        else:
+          unsolved.append((strategy, costbound))
+
+    print("\n*************************************")
+    print("Perimeter search respected the costbound in {} out of {} tests.".format(solved, 2 * len(tests)))
+    print("Tests that failed: {}".format(unsolved))
+    print("*************************************\n")
+    ##############################################################
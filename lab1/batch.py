@@ -0,0 +1,189 @@
+"""Batch solving of Snowman problems.
+
+    solve_batch fans a list of problems out over a pool of worker processes, one search per
+    problem, and yields the results as they complete. Results are memoized in an on-disk cache
+    keyed by the problem (board, robot and snowballs), the algorithm configuration and the
+    source of the solver, so rerunning unchanged problems doesn't search them again.
+
+    It can also be run from the command line, e.g.
+
+        python batch.py --algorithm anytime_weighted_astar --heuristic alternate --problems 0-9
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+
+from search import SearchEngine
+from snowman import snowman_goal_state
+from solution import *
+from test_problems import PROBLEMS
+
+#heuristics that can be selected by name
+HEURISTICS = {
+    'zero': heur_zero,
+    'manhattan': heur_manhattan_distance,
+    'alternate': heur_alternate,
+    'push_distance': heur_push_distance,
+    'pattern_database': heur_pattern_database,
+    'pattern_database_sum': heur_pattern_database_sum,
+}
+
+def _engine_search(strategy):
+    def search(initial_state, heur_fn, timebound):
+        engine = SearchEngine(strategy, 'full')
+        engine.init_search(initial_state, snowman_goal_state, heur_fn)
+        return engine.search(timebound)
+    return search
+
+#algorithms that can be selected by name: each takes (initial_state, heur_fn, timebound=...) and
+#returns a goal state or False. The timebound must be passed by keyword, as the anytime searches
+#take other parameters (e.g. the weight) before it. anytime_portfolio is left out as it runs its own process pool.
+ALGORITHMS = {
+    'astar': _engine_search('astar'),
+    'best_first': _engine_search('best_first'),
+    'anytime_gbfs': anytime_gbfs,
+    'anytime_weighted_astar': anytime_weighted_astar,
+}
+
+#source files whose changes invalidate the cache
+_SOURCES = ('search.py', 'snowman.py', 'solution.py')
+
+def _source_key():
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in _SOURCES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def problem_key(state):
+    '''Return a string that identifies the problem of a state across runs: its board, the
+       robot's cell and the snowballs (but not its action, gval or parent)'''
+    description = repr((state.board.key(), state.robot_cell, state.balls))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+def cache_key(state, algorithm, heuristic, timebound, source_key=None):
+    '''Return the key of the result of solving state with the given configuration'''
+    description = repr((problem_key(state), algorithm, heuristic, timebound, source_key or _source_key()))
+    return hashlib.sha1(description.encode()).hexdigest()
+
+def _solve(task):
+    '''Solve one problem in a worker process. Returns (index, result), where result is a dict
+       holding the cost and the actions of the solution found (both None if none was found)
+       and the time taken.'''
+    index, state, algorithm, heuristic, timebound = task
+    start = time.time()
+    goal_state = ALGORITHMS[algorithm](state, HEURISTICS[heuristic], timebound=timebound)
+    result = {'cost': None, 'actions': None, 'time': round(time.time() - start, 3)}
+    if goal_state:
+        actions = []
+        s = goal_state
+        while s.parent is not None:
+            actions.append(s.action)
+            s = s.parent
+        actions.reverse()
+        result['cost'] = goal_state.gval
+        result['actions'] = actions
+    return index, result
+
+def _read_cache(cache_dir, key):
+    path = os.path.join(cache_dir, key + '.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_cache(cache_dir, key, result):
+    #write to a temporary file first, so an interrupted run never leaves a partial entry
+    path = os.path.join(cache_dir, key + '.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(result, f)
+    os.replace(path + '.tmp', path)
+
+def solve_batch(problems, algorithm='anytime_weighted_astar', heuristic='alternate', timebound=5,
+                processes=None, cache_dir=None):
+    '''Solve a list of problems in parallel, yielding (index, result) pairs in the order the
+       problems are solved (see _solve for result). Cached results are yielded first, with
+       result['cached'] set to True. algorithm and heuristic are names from ALGORITHMS and
+       HEURISTICS, timebound is the time bound of each search and processes the number of
+       worker processes (the number of CPUs if None). Results are cached in cache_dir unless
+       it is None. Only solutions are cached: a problem that wasn't solved (e.g., because the
+       search ran out of time on a busy machine) is searched again on the next run.'''
+    if not algorithm in ALGORITHMS:
+        raise ValueError('Unknown algorithm {}, must be one of {}'.format(algorithm, sorted(ALGORITHMS)))
+    if not heuristic in HEURISTICS:
+        raise ValueError('Unknown heuristic {}, must be one of {}'.format(heuristic, sorted(HEURISTICS)))
+
+    keys = {}
+    tasks = []
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        source_key = _source_key()
+    for index, state in enumerate(problems):
+        if cache_dir is not None:
+            keys[index] = cache_key(state, algorithm, heuristic, timebound, source_key)
+            result = _read_cache(cache_dir, keys[index])
+            if result is not None:
+                result['cached'] = True
+                yield index, result
+                continue
+        tasks.append((index, state, algorithm, heuristic, timebound))
+
+    if not tasks:
+        return
+    pool = multiprocessing.Pool(min(processes or os.cpu_count(), len(tasks)))
+    try:
+        #chunksize 1 so that the slow problems don't hold up the others
+        for index, result in pool.imap_unordered(_solve, tasks, 1):
+            if cache_dir is not None and result['cost'] is not None:
+                _write_cache(cache_dir, keys[index], result)
+            result['cached'] = False
+            yield index, result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _parse_problems(spec):
+    '''Parse a list of problem numbers such as "0-4,7,9"'''
+    indices = []
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            indices.extend(range(int(first), int(last) + 1))
+        else:
+            indices.append(int(part))
+    return indices
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve Snowman problems in parallel.')
+    parser.add_argument('--algorithm', default='anytime_weighted_astar', choices=sorted(ALGORITHMS))
+    parser.add_argument('--heuristic', default='alternate', choices=sorted(HEURISTICS))
+    parser.add_argument('--timebound', type=float, default=5, help='time bound of each search (seconds)')
+    parser.add_argument('--problems', default='0-{}'.format(len(PROBLEMS) - 1), help='problems to solve, e.g. 0-4,7')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--cache-dir', default='.batch_cache', help='directory of the result cache')
+    parser.add_argument('--no-cache', action='store_true', help='neither read nor write the result cache')
+    args = parser.parse_args(argv)
+
+    indices = _parse_problems(args.problems)
+    problems = [PROBLEMS[i] for i in indices]
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    start = time.time()
+    solved = 0
+    for i, result in solve_batch(problems, args.algorithm, args.heuristic, args.timebound,
+                                 args.processes, cache_dir):
+        if result['cost'] is not None:
+            solved += 1
+        print('Problem {}: cost {} in {} sec{}'.format(indices[i], result['cost'], result['time'],
+                                                        ' (cached)' if result['cached'] else ''))
+        sys.stdout.flush()
+    print('Solved {} of {} problems in {:.2f} sec'.format(solved, len(problems), time.time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -38,14 +38,34 @@
 
     '''
 import heapq
+import itertools
 from collections import deque
 import os
+import time
+import json
+import shutil
+from array import array
+import mmap
+import tempfile
+import queue
+import multiprocessing
 
 class StateSpace:
     #represents a node in the state space of a generic search problem. The base class deﬁnes a fixed interface that is used by the SearchEngine class to perform a search in that state space.
     #For the Snowperson Puzzle problem, we will deﬁne a concrete subclass that inherits from StateSpace. This concrete sub-class will inherit some of the utility methods that are implemented in the base class.
     '''Abstract class for defining State spaces for search routines'''
-    n = 0
+
+    #source of state indices. The index only labels states in traces; the
+    #number of states generated by a search is counted by its SearchEngine.
+    _ids = itertools.count()
+
+    #states are created in large numbers, so don't give each one a __dict__.
+    #Subclasses that declare their own __slots__ stay dict free as well.
+    __slots__ = ('action', 'gval', 'parent', 'index')
+
+    #False in subclasses where some actions cost other than 1. Perimeter
+    #search (see Perimeter) needs every action to cost 1.
+    unit_costs = True
     
     def __init__(self, action, gval, parent):
         '''Problem specific state space objects must always include the data items
@@ -63,8 +83,7 @@ class StateSpace:
         
         self.parent = parent #the parent StateSpace object of s, i.e., the StateSpace object that has s as a successor. Will be None if s is the initial state.
         
-        self.index = StateSpace.n
-        StateSpace.n = StateSpace.n + 1
+        self.index = next(StateSpace._ids)
 
     def successors(self):
         '''This method when invoked on a state space object must return a
@@ -74,6 +93,22 @@ class StateSpace:
            Also any problem specific data must be specified property.'''        
         raise Exception("Must be overridden in subclass.")
 
+    def successor_candidates(self):
+        '''Generate a (hash, gval, candidate) triple for each successor of
+           self, where hash is the successor's hashable_state() and gval its
+           g-value. The search engine cycle checks the hash and only passes
+           surviving candidates to make_successor to build the successor
+           state. Subclasses can override both methods with lightweight
+           candidates (e.g., the action and the change it makes) so that
+           pruned successors are never constructed. The default simply uses
+           the successor states as candidates.'''
+        for succ in self.successors():
+            yield succ.hashable_state(), succ.gval, succ
+
+    def make_successor(self, candidate):
+        '''Return the successor state described by candidate (see successor_candidates)'''
+        return candidate
+
     def hashable_state(self):
         '''This method must return an immutable and unique representation
            of the state represented by self. The return value, e.g., a
@@ -86,6 +121,36 @@ class StateSpace:
         '''Print a representation of the state'''
         raise Exception("Must be overridden in subclass.")
 
+    def goal_states(self):
+        '''Return the goal states of the problem that self belongs to. Only
+           needed for perimeter search (see Perimeter).'''
+        raise Exception("Must be overridden in subclass.")
+
+    def predecessors(self):
+        '''Return the states from which self is reached by a single action,
+           each with "action" set to the name of that action. Only needed for
+           perimeter search (see Perimeter).'''
+        raise Exception("Must be overridden in subclass.")
+
+    def pack(self):
+        '''Return self as a bytes record of a fixed width (the same for every
+           state of the problem), such that two states are equal if and only
+           if their records are. Only needed for external memory search (see
+           SearchEngine.set_external).'''
+        raise Exception("Must be overridden in subclass.")
+
+    def unpack(self, record, gval):
+        '''Return the state packed in record (see pack), which belongs to the
+           same problem as self, with the given gval and no action or
+           parent. Only needed for external memory search.'''
+        raise Exception("Must be overridden in subclass.")
+
+    def perimeter(self, depth):
+        '''Return the Perimeter of the given depth around the goal states of
+           the problem that self belongs to. Subclasses can override this to
+           share perimeters between searches of the same problem.'''
+        return Perimeter(self.goal_states(), depth)
+
     def print_path(self):
         '''print the sequence of actions used to reach self'''
         #can be over ridden to print problem specific information
@@ -110,6 +175,358 @@ class StateSpace:
             s = s.parent
         return False
 
+#multiplier used to spread 64 bit keys over the slots of a ClosedTable (2**64 / golden ratio)
+_CLOSED_MIX = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+class ClosedTable:
+    '''A cycle check dictionary for searches whose states hash to 64 bit
+       integers (like the Zobrist hashes of SnowmanState) and whose gvals
+       are integers (see SearchEngine.set_closed_table). It is an open
+       addressing hash table with linear probing, whose keys and values are
+       kept in two flat buffers (unsigned 64 bit and 32 bit integers), about
+       24 bytes per state instead of the 100 or more of a dict. Other hashes
+       are replaced by their Python hash.
+
+       The table doubles when it is half full. If ram_budget (in bytes) is
+       given and the buffers would outgrow it, they are memory mapped onto
+       a temporary file (in spill_dir) instead, and the operating system
+       pages them in and out as needed.'''
+
+    def __init__(self, capacity = 1 << 16, ram_budget = None, spill_dir = None):
+        self.ram_budget = ram_budget
+        self.spill_dir = spill_dir
+        self.size = 0
+        #key 0 marks an empty slot, so its value is kept here
+        self.zero_value = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        nbytes = capacity * 12
+        if self.ram_budget is not None and nbytes > self.ram_budget:
+            with tempfile.TemporaryFile(dir=self.spill_dir) as f:
+                f.truncate(nbytes)
+                buffer = mmap.mmap(f.fileno(), nbytes)
+            self.spilled = True
+        else:
+            buffer = bytearray(nbytes)
+            self.spilled = False
+        view = memoryview(buffer)
+        self.keys = view[:capacity * 8].cast('Q')
+        self.values = view[capacity * 8:].cast('i')
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.shift = 64 - (capacity.bit_length() - 1)
+
+    def _slot(self, key):
+        '''Return the slot holding key, or the empty slot where it would go'''
+        keys = self.keys
+        i = ((key * _CLOSED_MIX) & _MASK64) >> self.shift
+        while True:
+            k = keys[i]
+            if k == key or k == 0:
+                return i
+            i = (i + 1) & self.mask
+
+    def _grow(self):
+        keys, values = self.keys, self.values
+        self._allocate(2 * self.capacity)
+        for i in range(len(keys)):
+            if keys[i]:
+                j = self._slot(keys[i])
+                self.keys[j] = keys[i]
+                self.values[j] = values[i]
+
+    def __len__(self): return self.size + (self.zero_value is not None)
+
+    def __contains__(self, key): return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if not isinstance(key, int):
+            key = hash(key)
+        key = key & _MASK64
+        if key == 0:
+            return default if self.zero_value is None else self.zero_value
+        i = self._slot(key)
+        return self.values[i] if self.keys[i] == key else default
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, int):
+            key = hash(key)
+        key = key & _MASK64
+        if key == 0:
+            self.zero_value = value
+            return
+        i = self._slot(key)
+        if self.keys[i] == 0:
+            self.keys[i] = key
+            self.size = self.size + 1
+        self.values[i] = value
+        if 2 * self.size > self.capacity:
+            self._grow()
+
+class PathTable:
+    '''The cycle check dictionary of a search with compact paths (see
+       SearchEngine.set_compact_paths). Like a dict from hashable_state to
+       the cheapest gval found, but every path recorded with add also keeps
+       the row of its parent and its action in flat arrays, so that states
+       need not keep their parents: the path to a state is put back together
+       from the rows when it is needed (see actions).'''
+
+    def __init__(self):
+        self.rows = dict()            #hashable_state -> row of its cheapest path
+        self.gvals = array('d')
+        self.parents = array('q')     #row of the parent, -1 for the initial state
+        self.actions = array('H')     #action number, see action_names
+        self.action_names = []
+        self.action_numbers = dict()
+
+    def __len__(self): return len(self.rows)
+
+    def __contains__(self, hash_state): return hash_state in self.rows
+
+    def __getitem__(self, hash_state): return self.gvals[self.rows[hash_state]]
+
+    def get(self, hash_state, default=None):
+        row = self.rows.get(hash_state)
+        return default if row is None else self.gvals[row]
+
+    def add(self, hash_state, gval, parent_hash, action):
+        '''Record a path of cost gval to a state, reached by action from the
+           state with hash parent_hash (None for the initial state). Rows are
+           never overwritten, as the old path may lead to other states.'''
+        number = self.action_numbers.get(action)
+        if number is None:
+            number = self.action_numbers[action] = len(self.action_names)
+            self.action_names.append(action)
+        self.rows[hash_state] = len(self.gvals)
+        self.gvals.append(gval)
+        self.parents.append(self.rows[parent_hash] if parent_hash is not None else -1)
+        self.actions.append(number)
+
+    def actions_to(self, hash_state):
+        '''Return the actions of the recorded path to a state, from the initial state'''
+        actions = []
+        row = self.rows[hash_state]
+        while self.parents[row] >= 0:
+            actions.append(self.action_names[self.actions[row]])
+            row = self.parents[row]
+        actions.reverse()
+        return actions
+
+def _records(path, width):
+    '''Generate the fixed width records of a file'''
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        for i in range(0, len(m), width):
+            yield m[i:i + width]
+
+def _unique(records):
+    '''Drop the repeats from sorted records'''
+    last = None
+    for record in records:
+        if record != last:
+            yield record
+            last = record
+
+def _difference(records, others):
+    '''Generate the sorted records that are not in the sorted records others'''
+    other = next(others, None)
+    for record in records:
+        while other is not None and other < record:
+            other = next(others, None)
+        if other != record:
+            yield record
+
+def _find_record(path, width, record):
+    '''Binary search for a record in a sorted file'''
+    size = os.path.getsize(path)
+    if size == 0:
+        return False
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        lo, hi = 0, size // width
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if m[mid * width:(mid + 1) * width] < record:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < size // width and m[lo * width:(lo + 1) * width] == record
+
+class ExternalFrontier:
+    '''The buckets of an external memory search (see SearchEngine.set_external),
+       stored as files of fixed width records (see StateSpace.pack) in a
+       temporary directory. Bucket (g, h) holds the states reached with gval
+       g and heuristic value h (for breadth first search g is the depth and h
+       is 0).
+
+       Records added to a bucket are buffered in memory; when buffer_records
+       of them are buffered, each buffer is sorted and written to a run
+       file. Duplicates are detected late: when a bucket is taken for
+       expansion its runs are merged into a single sorted file, without the
+       states of the buckets already expanded with the same h and a g that is
+       no greater. As h depends on the state only, this removes every state already
+       reached by a path that is no more expensive.'''
+
+    def __init__(self, directory, width, buffer_records):
+        self.directory = tempfile.mkdtemp(prefix='search-', dir=directory)
+        self.width = width
+        self.buffer_records = buffer_records
+        self.buffers = dict()   #key -> records not written yet
+        self.buffered = 0
+        self.runs = dict()      #key -> run files
+        self.layers = dict()    #key -> sorted files of an expanded bucket
+        self.names = itertools.count()
+
+    def _new_file(self):
+        return os.path.join(self.directory, "{}.bin".format(next(self.names)))
+
+    def add(self, key, record):
+        self.buffers.setdefault(key, []).append(record)
+        self.buffered = self.buffered + 1
+        if self.buffered >= self.buffer_records:
+            self.flush()
+
+    def flush(self):
+        '''Write the buffered records to run files'''
+        for key, records in self.buffers.items():
+            path = self._new_file()
+            with open(path, 'wb') as f:
+                f.write(b''.join(sorted(set(records))))
+            self.runs.setdefault(key, []).append(path)
+        self.buffers = dict()
+        self.buffered = 0
+
+    def next_key(self):
+        '''Return the key of the next bucket to expand, the one with the
+           smallest g+h and then the smallest g (None if all are empty)'''
+        keys = set(self.runs) | set(self.buffers)
+        return min(keys, key=lambda key: (key[0] + key[1], key[0])) if keys else None
+
+    def take(self, key):
+        '''Merge the runs of a bucket into its sorted, duplicate free layer
+           file (see the class comment) and return the file name'''
+        self.flush()
+        runs = self.runs.pop(key)
+        width = self.width
+        merged = _unique(heapq.merge(*[_records(path, width) for path in runs]))
+        #a bucket is expanded again if states are added to it after its
+        #expansion (which happens if the heuristic is not consistent)
+        older = [path for (g, h), paths in self.layers.items() if h == key[1] and g <= key[0] for path in paths]
+        seen = _unique(heapq.merge(*[_records(path, width) for path in older]))
+        path = self._new_file()
+        with open(path, 'wb') as f:
+            for record in _difference(merged, seen):
+                f.write(record)
+        for run in runs:
+            os.remove(run)
+        self.layers.setdefault(key, []).append(path)
+        return path
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def _advance_path(path, on_path, state):
+    '''Make path (a list of (state, hash) pairs, from the initial state down)
+       and on_path (the set of their hashes) the path to state, which must be
+       a child of a state on the path, or of a state that is not on it at all
+       (then the path is rebuilt from the parent pointers).'''
+    parent = state.parent
+    while path and path[-1][0] is not parent:
+        on_path.discard(path.pop()[1])
+    if not path and parent is not None:
+        s = parent
+        while s is not None:
+            path.append((s, s.hashable_state()))
+            s = s.parent
+        path.reverse()
+        on_path.update(hash_state for s, hash_state in path)
+    hash_state = state.hashable_state()
+    path.append((state, hash_state))
+    on_path.add(hash_state)
+
+class Perimeter:
+    '''The set of states from which a goal can be reached within depth
+       actions, found by a breadth first search backwards from the goal
+       states (using StateSpace.predecessors). All actions are assumed to
+       have cost 1.
+
+       For each state in the perimeter the table stores its distance to the
+       goal and the hash of the next state on a shortest path to the goal,
+       so that a search which reaches the perimeter can be completed
+       without further search. Every state outside the perimeter is more
+       than depth actions away from the goal.'''
+
+    def __init__(self, goal_states, depth):
+        self.depth = depth
+        self.table = dict()
+        frontier = []
+        for state in goal_states:
+            hash_state = state.hashable_state()
+            if hash_state not in self.table:
+                self.table[hash_state] = (0, None)
+                frontier.append(state)
+
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for state in frontier:
+                hash_state = state.hashable_state()
+                for pred in state.predecessors():
+                    hash_pred = pred.hashable_state()
+                    if hash_pred not in self.table:
+                        self.table[hash_pred] = (distance, hash_state)
+                        next_frontier.append(pred)
+            frontier = next_frontier
+
+    def __len__(self): return len(self.table)
+
+    def __contains__(self, state): return state.hashable_state() in self.table
+
+    def goal_fn(self, goal_fn, costbound=None):
+        '''Return a goal function that also accepts states on the perimeter.
+           With a costbound (see SearchEngine.search) a state on the
+           perimeter is only accepted if the goal that complete reaches from
+           it is within the bound: that goal has gval+distance as its g and
+           g+h, and distance as its largest h along the way.'''
+        table = self.table
+        if costbound is None:
+            return lambda state: state.hashable_state() in table or goal_fn(state)
+        def perimeter_goal_fn(state):
+            entry = table.get(state.hashable_state())
+            if entry is None:
+                return goal_fn(state)
+            cost = state.gval + entry[0]
+            return cost <= costbound[0] and entry[0] <= costbound[1] and cost <= costbound[2]
+        return perimeter_goal_fn
+
+    def heur_fn(self, heur_fn):
+        '''Return a heuristic that is exact on the perimeter and, elsewhere,
+           at least depth+1 (which keeps an admissible heur_fn admissible)'''
+        table = self.table
+        outside = self.depth + 1
+        def perimeter_hfn(state):
+            entry = table.get(state.hashable_state())
+            if entry is not None:
+                return entry[0]
+            return max(heur_fn(state), outside)
+        return perimeter_hfn
+
+    def complete(self, state):
+        '''Follow the perimeter from state to a goal, returning the goal
+           state (whose parent chain passes through state)'''
+        distance, next_hash = self.table.get(state.hashable_state(), (0, None))
+        while next_hash is not None:
+            state = next(succ for succ in state.successors() if succ.hashable_state() == next_hash)
+            next_hash = self.table[next_hash][1]
+        return state
+
 #Constants to denote the search strategy. 
 _DEPTH_FIRST = 0
 _BREADTH_FIRST = 1
@@ -117,6 +534,11 @@ _BEST_FIRST = 2
 _ASTAR = 3
 _UCS = 4
 _CUSTOM = 5
+#Memory bounded strategies. They don't use OPEN: IDA* runs depth first
+#searches with an increasing f-value threshold, RBFS (recursive best first
+#search) keeps only the current path and the siblings of its nodes.
+_IDA_STAR = 6
+_RBFS = 7
 
 #For best first and astar we use a priority queue. This requires
 #a comparison function for nodes. These constants indicate if we use
@@ -133,6 +555,19 @@ _CC_NONE = 0
 _CC_PATH = 1
 _CC_FULL = 2
 
+#Implementation of OPEN for the strategies that use a priority queue. Either
+#'heap' (a binary heap; a state reached again via a cheaper path is pushed
+#again and the stale entry is skipped when extracted) or 'indexed' (a binary
+#heap that also indexes its entries by state, so the entry of a state
+#already on OPEN is updated in place: decrease-key) or 'bucket' (an array
+#of buckets indexed by the key, for integer keys only; not for custom).
+#'auto' picks 'bucket' when the engine has been told that costs and
+#heuristic values are integers, and 'heap' otherwise.
+_OPEN_HEAP = 0
+_OPEN_INDEXED = 1
+_OPEN_BUCKET = 2
+_OPEN_AUTO = 3
+
 #Zero Heuristic Function---for uninformed search don't include heur_fn
 #in call to search engine's search method, defaults heur_fn to the zero fn.
 def _zero_hfn(state):
@@ -150,16 +585,23 @@ class sNode:
     redundant as it is stored in the state, but we make a copy in the
     node object for convenience), and the number of the node'''
     
-    n = 0
+    #nodes are kept on OPEN by the hundred thousand, so they don't get a __dict__
+    __slots__ = ('state', 'hval', 'gval', 'index', 'fval_function')
+
+    #source of node indices (labels only, see StateSpace._ids)
+    _ids = itertools.count()
+
+    #comparison used by __lt__ when nodes are compared directly. The search
+    #engine never compares nodes (Open keys its priority queue entries
+    #instead), so this is not changed by searches.
     lt_type = _SUM_HG
     
     def __init__(self, state, hval, fval_function):
         self.state = state
         self.hval = hval
         self.gval = state.gval
-        self.index = sNode.n
+        self.index = next(sNode._ids)
         self.fval_function = fval_function
-        sNode.n = sNode.n + 1
 
     def __lt__(self, other):
         '''For astar and best first we use a priority queue for the
@@ -173,16 +615,16 @@ class sNode:
            value. This means that we expand nodes along deeper paths
            first causing the search to proceed directly to the goal'''
                 
-        if sNode.lt_type == _SUM_HG:
+        if self.lt_type == _SUM_HG:
             if (self.gval+self.hval) == (other.gval+other.hval):
                 #break ties by greatest gval. 
                 return self.gval > other.gval
             else: return ((self.gval+self.hval) < (other.gval+other.hval))
-        if sNode.lt_type == _G:
+        if self.lt_type == _G:
             return self.gval < other.gval
-        if sNode.lt_type == _H:
+        if self.lt_type == _H:
             return self.hval < other.hval    
-        if sNode.lt_type == _C:  
+        if self.lt_type == _C:  
             return self.fval_function(self) <  other.fval_function(other)          
         
         print('sNode class has invalid comparator setting!')
@@ -190,6 +632,128 @@ class sNode:
         #return default of lowest gval (generating UCS behavior)
         return self.gval < other.gval
 
+#The (primary key, tiebreak) of a node for each strategy that uses a
+#priority queue. Smaller keys are extracted first.
+_PRIORITY_KEYS = {
+    _UCS: lambda node: (node.gval, 0),
+    _BEST_FIRST: lambda node: (node.hval, 0),
+    _ASTAR: lambda node: (node.gval + node.hval, -node.gval),
+    _CUSTOM: lambda node: (node.fval_function(node), 0),
+}
+
+class IndexedHeap:
+    '''A binary heap of (primary key, tiebreak, counter, hash, node) entries
+       together with a map from each entry's hash (the node's
+       hashable_state()) to its position in the heap. Each state has at
+       most one entry: pushing a node for a state that is already in the
+       heap replaces the entry if the new node has a lower gval, and is
+       ignored otherwise.'''
+
+    def __init__(self, key):
+        self.heap = []
+        self.pos = dict()
+        self.key = key
+        self.counter = itertools.count()
+
+    def __len__(self): return len(self.heap)
+
+    def push(self, node):
+        hash_state = node.state.hashable_state()
+        primary, tiebreak = self.key(node)
+        entry = (primary, tiebreak, next(self.counter), hash_state, node)
+        i = self.pos.get(hash_state)
+        if i is None:
+            self.heap.append(entry)
+            self._sift_up(len(self.heap) - 1, entry)
+        elif node.gval < self.heap[i][-1].gval:
+            #the key may go either way (e.g., best first keys ignore gval)
+            self._sift_up(i, entry)
+            i = self.pos[hash_state]
+            self._sift_down(i, self.heap[i])
+
+    def pop(self):
+        heap = self.heap
+        top = heap[0]
+        del self.pos[top[3]]
+        last = heap.pop()
+        if heap:
+            self._sift_down(0, last)
+        return top[-1]
+
+    def _sift_up(self, i, entry):
+        '''Place entry at position i and move it up until its parent is smaller'''
+        heap = self.heap
+        pos = self.pos
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][3]] = i
+            i = parent
+        heap[i] = entry
+        pos[entry[3]] = i
+
+    def _sift_down(self, i, entry):
+        '''Place entry at position i and move it down until its children are larger'''
+        heap = self.heap
+        pos = self.pos
+        n = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child = child + 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][3]] = i
+            i = child
+        heap[i] = entry
+        pos[entry[3]] = i
+
+class BucketQueue:
+    '''A bucket (dial) priority queue for nodes with small non-negative
+       integer keys: bucket k holds the nodes with primary key k (key is
+       one of the functions of _PRIORITY_KEYS). Insertion and
+       extraction are O(1) apart from skipping over empty buckets, which
+       is cheap as keys of successive extractions are close together.
+       Nodes within a bucket come out last in first out, so for astar
+       (key = gval + hval) the most recently generated (typically deepest)
+       node is preferred, like the greater-gval tiebreak of sNode.__lt__.'''
+
+    def __init__(self, key):
+        self.buckets = []
+        self.key = key
+        self.min = 0    #no bucket below min is non-empty
+        self.size = 0
+
+    def __len__(self): return self.size
+
+    def push(self, node):
+        #the tiebreak is not used: nodes within a bucket come out last in first out
+        k = self.key(node)[0]
+        buckets = self.buckets
+        if k >= len(buckets):
+            buckets.extend([] for _ in range(k + 1 - len(buckets)))
+        buckets[k].append(node)
+        if k < self.min:
+            self.min = k
+        self.size = self.size + 1
+
+    def pop(self):
+        buckets = self.buckets
+        k = self.min
+        while not buckets[k]:
+            k = k + 1
+        self.min = k
+        self.size = self.size - 1
+        return buckets[k].pop()
+
+    def nodes(self):
+        return [node for bucket in self.buckets for node in bucket]
+
 class Open:
     '''Open objects hold the search frontier---the set of unexpanded
        nodes. Depending on the search strategy used we want to extract
@@ -197,7 +761,9 @@ class Open:
        functions to operate as needed by the particular search
        strategy'''
     
-    def __init__(self, search_strategy):
+    def __init__(self, search_strategy, open_impl=_OPEN_HEAP):
+        #Open keeps all of its configuration to itself, so several searches
+        #(with different strategies) can run in the same process.
         if search_strategy == _DEPTH_FIRST:
             #use stack for OPEN set (last in---most recent successor added---is first out)
             self.open = []
@@ -208,46 +774,215 @@ class Open:
             self.open = deque()
             self.insert = self.open.append
             self.extract = self.open.popleft
-        elif search_strategy == _UCS:
-            #use priority queue for OPEN (first out is node with lowest gval)
-            self.open = []
-            #set node less than function to compare gvals only
-            sNode.lt_type = _G
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)            
-        elif search_strategy == _BEST_FIRST:
-            #use priority queue for OPEN (first out is node with lowest hval)
-            self.open = []
-            #set node less than function to compare hvals only
-            sNode.lt_type = _H
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
-        elif search_strategy == _ASTAR:
-            #use priority queue for OPEN (first out is node with lowest fval = gval+hval)
-            self.open = []
-            #set node less than function to compare sums of hval and gval
-            sNode.lt_type = _SUM_HG
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open) 
-        elif search_strategy == _CUSTOM:
-            #use priority queue for OPEN (first out is node with lowest fval)
+        elif open_impl == _OPEN_BUCKET and search_strategy != _CUSTOM:
+            #use a bucket queue keyed on the integer gval, hval or gval+hval
+            queue = BucketQueue(_PRIORITY_KEYS[search_strategy])
+            self.open = queue
+            self.insert = queue.push
+            self.extract = queue.pop
+            self.nodes = queue.nodes
+        elif open_impl == _OPEN_INDEXED:
+            #use an indexed priority queue: at most one entry per state
+            heap = IndexedHeap(_PRIORITY_KEYS[search_strategy])
+            self.open = heap.heap
+            self.insert = heap.push
+            self.extract = heap.pop
+            self.nodes = lambda: [entry[-1] for entry in heap.heap]
+        else:
+            #use a priority queue for the remaining strategies. The queue holds
+            #(primary key, tiebreak, counter, node) entries whose key is computed
+            #once, when the node is inserted, so heapq only compares tuples of
+            #numbers and never calls back into sNode. The counter makes entries
+            #with equal keys come out in insertion order (and keeps heapq from
+            #ever comparing two nodes).
             self.open = []
-            #set node less than function to compare sums of fval    
-            sNode.lt_type = _C
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)          
+            counter = itertools.count()
+            heap = self.open
+            push = heapq.heappush
+            #first out is the node with the lowest key (see _PRIORITY_KEYS)
+            key = _PRIORITY_KEYS[search_strategy]
+            self.insert = lambda node: push(heap, (*key(node), next(counter), node))
+            pop = heapq.heappop
+            self.extract = lambda: pop(heap)[-1]
+            self.nodes = lambda: [entry[-1] for entry in heap]
 
     def empty(self): return not self.open
 
+    def nodes(self):
+        '''Return the nodes currently on OPEN'''
+        return list(self.open)
+
     def print_open(self):
         print("{", end="")
-        if len(self.open) == 1: 
-            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(self.open[0].state.index, self.open[0].state.action, self.open[0].state.hashable_state(), self.open[0].gval, self.open[0].hval, self.open[0].gval+self.open[0].hval), end="")
-        else:
-            for nd in self.open:
-                print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action, nd.state.hashable_state(), nd.gval, nd.hval, nd.gval+nd.hval), end="")
+        for nd in self.nodes():
+            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action, nd.state.hashable_state(), nd.gval, nd.hval, nd.gval+nd.hval), end="")
         print("}")
 
+class SearchStats:
+    '''Statistics of a search, kept by the SearchEngine in its stats
+       attribute (see SearchEngine.search).
+
+       expanded, generated: nodes expanded and states generated.
+       duplicates: successors pruned by cycle checking.
+       reopened: successors that reached an already reached state by a
+           cheaper path (and were put on OPEN again).
+       pruned: successors pruned by the cost bound.
+       peak_open, peak_closed: the most nodes on OPEN, and the most states
+           in the cycle check dictionary (searches with an OPEN list only).
+       time_successors, time_heuristic, time_hashing, time_queue: the time
+           spent generating successors, computing heuristic values, hashing
+           states (including the cycle check dictionary) and on OPEN. These
+           are only measured if profiling is on (see set_profiling).
+       search_time: the time the search took, timed_out: True if it ran
+           out of time.'''
+
+    __slots__ = ('expanded', 'generated', 'duplicates', 'reopened', 'pruned', 'peak_open', 'peak_closed',
+                 'time_successors', 'time_heuristic', 'time_hashing', 'time_queue', 'search_time', 'timed_out')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+        self.timed_out = False
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return "SearchStats({})".format(", ".join("{}={}".format(name, getattr(self, name)) for name in self.__slots__))
+
+class Tracer:
+    '''Receives the events of a search with an OPEN list (see
+       SearchEngine.set_tracer). Each event has a kind, the state (None for
+       successors pruned before their state was built), its hash, gval and
+       hval (None if not computed yet), and for prunings the reason:
+       'cycle', 'path' or 'bound' for successors, 'stale' or 'closed' for
+       nodes taken from OPEN. The kinds are
+
+       'expand'   : a node is expanded
+       'generate' : a successor state is built and its heuristic computed
+       'prune'    : a successor or node is discarded
+       'goal'     : a goal is taken from OPEN
+
+       This tracer ignores the events; subclasses record them.'''
+
+    def start(self, engine):
+        '''Called when a search (or a resumed search) starts'''
+        pass
+
+    def event(self, kind, state, hash_state, gval, hval, reason=None):
+        pass
+
+    def record(self, kind, state, hash_state, gval, hval, reason):
+        '''The compact record of an event: a tuple of plain values'''
+        return (kind, state.index if state is not None else None, hash_state, gval, hval, reason)
+
+class PrintTracer(Tracer):
+    '''Prints the events, for debugging (see SearchEngine.trace_on). At
+       level 1 expansions, successors and goals are printed, at level 2 also
+       the successor states and the prunings.'''
+
+    def __init__(self, level = 1):
+        self.level = level
+
+    def start(self, engine):
+        print("   TRACE: Initial OPEN: ", end="")
+        engine.open.print_open()
+
+    def event(self, kind, state, hash_state, gval, hval, reason=None):
+        if kind == 'prune':
+            if self.level > 1:
+                print("   TRACE: Pruned ({}): {}, g={}".format(reason, hash_state, gval))
+            return
+        label = {'expand': "Next State to expand", 'generate': "Successor", 'goal': "Goal"}[kind]
+        print("   TRACE: {}: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
+            label, state.index, state.action, hash_state, gval, hval, gval + hval))
+        if kind == 'generate' and self.level > 1:
+            print("   TRACE: Successor State:", end="")
+            state.print_state()
+
+class RingBufferTracer(Tracer):
+    '''Keeps the records (see Tracer.record) of the last size events in
+       self.records'''
+
+    def __init__(self, size = 100000):
+        self.records = deque(maxlen=size)
+
+    def event(self, kind, state, hash_state, gval, hval, reason=None):
+        self.records.append(self.record(kind, state, hash_state, gval, hval, reason))
+
+class JSONLTracer(Tracer):
+    '''Writes the record (see Tracer.record) of each event to a file, one
+       JSON list per line. Hashes that are not JSON values are written as
+       their repr. Call close when done.'''
+
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def event(self, kind, state, hash_state, gval, hval, reason=None):
+        self.file.write(json.dumps(self.record(kind, state, hash_state, gval, hval, reason), default=repr))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+#clocks a time bound can be measured with (see SearchEngine.set_clock)
+_CLOCKS = {'cpu': time.process_time, 'wall': time.monotonic}
+
+#a Deadline reads its clock about this often (in seconds)
+_DEADLINE_INTERVAL = 0.001
+
+def _timed(fn, stats, field):
+    '''Wrap fn so that the time spent in it is added to the given field of stats'''
+    clock = time.perf_counter
+    def timed_fn(*args):
+        start = clock()
+        result = fn(*args)
+        setattr(stats, field, getattr(stats, field) + clock() - start)
+        return result
+    return timed_fn
+
+class Deadline:
+    '''A time bound that is cheap enough to check once per expansion.
+
+       Reading the clock costs a system call, so expired() only reads it once
+       every self.every calls. After each reading self.every is adapted to the
+       rate at which expired() has been called, so that the clock is read
+       about every _DEADLINE_INTERVAL seconds (or more often when the
+       deadline is closer than that), which bounds the overrun.'''
+
+    def __init__(self, timebound, clock=time.process_time):
+        self.clock = clock
+        self.start = clock()
+        self.stop = self.start + timebound if timebound else None
+        self.every = 1
+        self.countdown = 1
+        self.last = self.start
+
+    def elapsed(self):
+        '''Return the time spent since the deadline was set'''
+        return self.clock() - self.start
+
+    def expired(self):
+        '''Return True if the time bound has been exceeded'''
+        if self.stop is None:
+            return False
+        self.countdown = self.countdown - 1
+        if self.countdown > 0:
+            return False
+        now = self.clock()
+        if now >= self.stop:
+            return True
+        interval = min(_DEADLINE_INTERVAL, (self.stop - now) / 2)
+        spent = now - self.last
+        #grow by at most a factor of 2, in case the clock is coarser than the interval
+        if spent > 0:
+            self.every = max(1, min(int(self.every * interval / spent), 2 * self.every))
+        else:
+            self.every = 2 * self.every
+        self.countdown = self.every
+        self.last = now
+        return False
+
 class SearchEngine:
     
     #An object of class SearchEngine and with the name se runs the search procedure. A SearchEngine object is initialized with a search strategy (’depth ﬁrst’, ’breadth ﬁrst’, ’best ﬁrst’, ’a star’ or ’custom’) and a cycle checking level (’none’, ’path’, or ’full’).
@@ -258,38 +993,97 @@ class SearchEngine:
     
     #An object of class Open is used to represent the search frontier. An Open object organizes the search frontier in a way that is appropriate for a given search strategy.
     
-    def __init__(self, strategy = 'depth_first', cc_level = 'default'):
+    def __init__(self, strategy = 'depth_first', cc_level = 'default', open_impl = 'auto', integral = False, node_budget = None):
         self.set_strategy(strategy, cc_level)
+
+        #open_impl selects the priority queue used by ucs, best_first, astar and custom: 'heap', 'indexed', 'bucket' or 'auto' (see Open).
+        #'indexed' keeps OPEN free of duplicate states under full cycle checking.
+        #integral tells the engine that all transition costs and heuristic values are integers, in which case 'auto' uses 'bucket'.
+        self.set_open_impl(open_impl)
+        self.integral = integral
+
+        #node_budget bounds the number of nodes kept in memory by ida_star and rbfs (see set_node_budget).
+        self.set_node_budget(node_budget)
+
+        #perimeter search is off unless set_perimeter is called.
+        self.perimeter_depth = None
+
+        #resumable (ARA*-style) search is off unless set_resumable is called.
+        self.resumable = False
+
+        #time bounds are on CPU time unless set_clock is called.
+        self.clock = _CLOCKS['cpu']
+        self.timed_out = False
+
+        #phases of the search are only timed if set_profiling is called,
+        #and there is no stats callback unless set_stats_callback is called.
+        self.profiling = False
+        self.stats_callback = None
+        self.stats_every = 1000
+
+        #states keep their parents unless set_compact_paths is called.
+        self.compact_paths = False
+
+        #the cycle check dictionary is a dict unless set_closed_table is called.
+        self.closed_table = False
+        self.closed_ram_budget = None
+        self.closed_spill_dir = None
+
+        #OPEN and the cycle check dictionary are kept in memory unless set_external is called.
+        self.external_dir = None
+        self.external_buffer = 1 << 20
+
+        #searches run in this process unless set_hda is called.
+        self.hda_processes = None
+        self.hda_batch_size = 64
         
         #if set to custom, you will have to specify the way that f-values of nodes are calculated; these values will structure the order of the nodes that are expanded during your search.
         
         self.trace = 0
+        self.tracer = None
 
     def initStats(self):
-        sNode.n = 0
-        StateSpace.n = 1    #initial state already generated on call so search
+        #statistics are kept per engine so that searches don't interfere
+        self.nodes_expanded = 0
+        self.states_generated = 1    #initial state already generated on call so search
         self.cycle_check_pruned = 0
         self.cost_bound_pruned = 0
+        self.reopened = 0
+        self.peak_open = 0
+        self.stats = SearchStats()
 
     def trace_on(self, level = 1):
         '''For debugging, set tracking level 1 or 2'''
         self.trace = level
+        self.tracer = PrintTracer(level)
 
     def trace_off(self):
         '''Turn off tracing'''
         self.trace = 0
+        self.tracer = None
+
+    def set_tracer(self, tracer):
+        '''Send the events of searches with an OPEN list to tracer (see
+           Tracer), e.g., a RingBufferTracer or a JSONLTracer. Use None to
+           turn tracing off, which selects a search loop without any
+           tracing code.'''
+        self.tracer = tracer
 
     def set_strategy(self, s, cc = 'default'):
-        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom']:
+        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom', 'ida_star', 'rbfs']:
             print('Unknown search strategy specified:', s)
-            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom' or 'astar'")
+            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom', 'astar', 'ida_star' or 'rbfs'")
         elif not cc in ['default', 'none', 'path', 'full']:
             print('Unknown cycle check level', cc)
             print( "Must be one of ['default', 'none', 'path', 'full']")
+        elif s in ['ida_star', 'rbfs'] and not cc in ['default', 'path']:
+            #the memory bounded strategies always check their current path for cycles
+            print('Cycle check level', cc, 'is not supported by', s)
+            print("Must be one of ['default', 'path']")
 
         else:
             if cc == 'default' :
-                if s == 'depth_first' :
+                if s in ['depth_first', 'ida_star', 'rbfs'] :
                     self.cycle_check = _CC_PATH
                 else:
                     self.cycle_check = _CC_FULL
@@ -303,6 +1097,158 @@ class SearchEngine:
             elif s == 'best_first'   : self.strategy = _BEST_FIRST
             elif s == 'astar'        : self.strategy = _ASTAR       
             elif s == 'custom' : self.strategy = _CUSTOM             
+            elif s == 'ida_star' : self.strategy = _IDA_STAR
+            elif s == 'rbfs' : self.strategy = _RBFS
+
+    def set_open_impl(self, open_impl):
+        if not open_impl in ['heap', 'indexed', 'bucket', 'auto']:
+            print('Unknown OPEN implementation specified:', open_impl)
+            print("Must be one of 'heap', 'indexed', 'bucket' or 'auto'")
+        elif open_impl == 'heap': self.open_impl = _OPEN_HEAP
+        elif open_impl == 'indexed': self.open_impl = _OPEN_INDEXED
+        elif open_impl == 'bucket': self.open_impl = _OPEN_BUCKET
+        elif open_impl == 'auto': self.open_impl = _OPEN_AUTO
+
+    def set_node_budget(self, node_budget):
+        '''Bound the memory used by the ida_star and rbfs strategies. For
+           ida_star the budget is the size of the transposition table (states
+           already visited in the current iteration, and their gval), which
+           is unbounded when node_budget is None. rbfs gives up (and returns
+           False) if the nodes it holds along the current path would exceed
+           the budget.'''
+        self.node_budget = node_budget
+
+    def set_perimeter(self, depth):
+        '''Turn on perimeter search: init_search builds (or reuses) the
+           Perimeter of the given depth around the goal (see
+           StateSpace.perimeter), and the search stops as soon as it
+           extracts a state on the perimeter (whose completed goal is within
+           the costbound of search), which is then completed to a goal along
+           the perimeter. Inside the perimeter the heuristic is
+           replaced by the exact distance to the goal, outside it is raised
+           to at least depth+1. Requires unit cost actions (see
+           StateSpace.unit_costs); init_search turns perimeter search off
+           for other state spaces. Use None to turn perimeter search off.'''
+        self.perimeter_depth = depth
+
+    def set_resumable(self, resumable = True):
+        '''Make searches with an OPEN list resumable, in the style of ARA*:
+           after search returns a solution, call reweight with a new
+           fval_function and call search again to continue from the same
+           OPEN, cycle check dictionary and closed set instead of starting
+           over. States expanded since the last reweight are kept in a
+           closed set; when a cheaper path to one of them is found it is
+           put on the INCONS list (and not on OPEN) until the next
+           reweight. Requires full cycle checking.'''
+        if resumable and self.cycle_check != _CC_FULL:
+            print('Resumable search requires full cycle checking')
+        else:
+            self.resumable = resumable
+
+    def set_hda(self, processes, batch_size = 64):
+        '''Run astar and ucs searches as hash distributed A* (HDA*) over the
+           given number of worker processes. Each state is owned by the worker
+           hash(state.hashable_state()) % processes, which keeps its own OPEN
+           and cycle check dictionary; successors are sent to their owners in
+           batches of batch_size states. The cost of the best solution found so
+           far is shared by all workers, which prune nodes that can't improve
+           on it, and the search ends when no worker has anything left to
+           expand. Cycle checking is always full.
+
+           The workers are forked, so goal_fn and heur_fn need not be
+           picklable, but states are sent between processes and must pickle
+           (without their parent, which is not sent). If a worker dies (e.g.,
+           because heur_fn raised an exception in it) the others are stopped
+           and search raises an exception. Use None (or 1) to search in this
+           process again.'''
+        if processes is not None and processes < 1:
+            print('The number of processes must be at least 1')
+        else:
+            self.hda_processes = processes if processes != 1 else None
+            self.hda_batch_size = batch_size
+
+    def set_clock(self, clock):
+        '''Choose what the timebound of search measures: 'cpu' (the CPU time
+           of this process, the default) or 'wall' (elapsed time, from a
+           monotonic clock). HDA* searches always use elapsed time.'''
+        if not clock in _CLOCKS:
+            print('Unknown clock specified:', clock)
+            print("Must be one of 'cpu' or 'wall'")
+        else:
+            self.clock = _CLOCKS[clock]
+
+    def set_compact_paths(self, compact_paths = True):
+        '''Save memory in searches with an OPEN list and full cycle checking:
+           successors are put on OPEN without their parent, and the path to
+           each state reached is kept in a PathTable (hash, parent row and
+           action number per state) instead. States that are no longer on
+           OPEN can then be freed. When a goal is found its path is replayed
+           from the initial state, so the goal returned by search has its
+           parents as usual. Actions must tell the successors of a state
+           apart.'''
+        if compact_paths and self.cycle_check != _CC_FULL:
+            print('Compact paths require full cycle checking')
+        else:
+            self.compact_paths = compact_paths
+
+    def set_closed_table(self, closed_table = True, ram_budget = None, spill_dir = None):
+        '''Keep the cycle check dictionary of full cycle checking in a
+           ClosedTable instead of a dict: much less memory per state, at the
+           cost of slower lookups. States must hash to 64 bit integers and
+           gvals must be integers that fit in 32 bits. Once the table would
+           need more than ram_budget bytes it is memory mapped onto a file in
+           spill_dir (the default temporary directory if None). Not used
+           together with compact paths (see set_compact_paths).'''
+        self.closed_table = closed_table
+        self.closed_ram_budget = ram_budget
+        self.closed_spill_dir = spill_dir
+
+    def set_external(self, directory, buffer_records = 1 << 20):
+        '''Run breadth_first and astar searches in external memory, for
+           searches whose OPEN and cycle check dictionary don't fit in RAM.
+           States are kept as fixed width records (see StateSpace.pack) in
+           files in a temporary directory under directory (the default
+           temporary directory if ''), in buckets by gval and hval that are
+           expanded in order of f-value (see ExternalFrontier). At most
+           buffer_records records are held in memory.
+
+           breadth_first expands the states by depth (the gvals seen by
+           goal_fn and heur_fn are depths). astar needs integer gvals and
+           positive transition costs, and finds an optimal solution if the
+           heuristic is admissible. Only the records are stored, so when a goal is
+           found its path is found by searching the buckets for a parent of
+           each state (using StateSpace.predecessors if it is implemented)
+           and then replayed from the initial state. Use None to search in
+           memory again.'''
+        self.external_dir = directory
+        self.external_buffer = buffer_records
+
+    def set_profiling(self, profiling = True):
+        '''Measure the time spent on successor generation, heuristic values,
+           hashing and OPEN (see SearchStats). This slows down the search a
+           little, so it is off by default.'''
+        self.profiling = profiling
+
+    def set_stats_callback(self, callback, every = 1000):
+        '''Call callback(stats) with the (up to date) SearchStats of the search
+           every time another every nodes have been expanded (searches with an
+           OPEN list only). Use None to remove the callback.'''
+        self.stats_callback = callback
+        self.stats_every = every
+
+    def update_stats(self):
+        '''Bring self.stats up to date with the counters of the search, and return it'''
+        stats = self.stats
+        stats.expanded = self.nodes_expanded
+        stats.generated = self.states_generated
+        stats.duplicates = self.cycle_check_pruned
+        stats.reopened = self.reopened
+        stats.pruned = self.cost_bound_pruned
+        stats.peak_open = self.peak_open
+        if self.cycle_check == _CC_FULL and getattr(self, 'cc_dictionary', None) is not None:
+            stats.peak_closed = len(self.cc_dictionary)
+        stats.timed_out = self.timed_out
+        return stats
 
     def get_strategy(self):
         if   self.strategy == _DEPTH_FIRST    : rval = 'depth_first'
@@ -311,6 +1257,8 @@ class SearchEngine:
         elif self.strategy == _UCS          : rval = 'ucs' 
         elif self.strategy == _ASTAR          : rval = 'astar'      
         elif self.strategy == _CUSTOM          : rval = 'custom'   
+        elif self.strategy == _IDA_STAR        : rval = 'ida_star'
+        elif self.strategy == _RBFS            : rval = 'rbfs'
   
         rval = rval + ' with '
 
@@ -320,7 +1268,7 @@ class SearchEngine:
 
         return rval
 
-    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function):
+    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function, heur_batch_fn=None):
         
         #setting up a specific search
         
@@ -331,6 +1279,8 @@ class SearchEngine:
         #heur_fn(s) is a function that returns a heuristic value for the state s. This function will only be used if your search engine has been instantiated to be a heuristic search (e.g., best first).
         
         #fval_fn(sNode) deﬁnes f-values for states. This function will only be used by your search engine if it has been instantiated to execute a custom search. Note that this function takes in an sNode and that an sNode contains not only a state but additional measures of the state (e.g., a gval). The function will use the variables that are provided in order to arrive at an f-value calculation for the state contained in the
+
+        #heur_batch_fn(states) is an optional function that returns the heuristic values of a list of states (as a list or array), which must equal those of heur_fn. If given, the ucs, best_first, astar and custom searches expand nodes until they have about _HEUR_BATCH successors and compute their heuristic values with a single call, which lets it vectorize the computation. The successors are put on OPEN before a goal is returned, so astar stays optimal, but it may expand a few more nodes. If heur_fn is not given it is derived from heur_batch_fn.
         
         
         
@@ -346,26 +1296,93 @@ class SearchEngine:
         
         self.initStats()
 
+        if heur_batch_fn is not None and heur_fn is _zero_hfn:
+            heur_fn = lambda state: heur_batch_fn([state])[0]
+
         #BEGIN TRACING
         if self.trace:
             print("   TRACE: Search Strategy: ", self.get_strategy())
             print("   TRACE: Initial State:", end="")
             initState.print_state()
         #END 
-        self.open = Open(self.strategy)
+        self.perimeter = None
+        if self.perimeter_depth is not None and not initState.unit_costs:
+            print('Perimeter search requires actions of cost 1, searching without a perimeter')
+        elif self.perimeter_depth is not None:
+            self.perimeter = initState.perimeter(self.perimeter_depth)
+            #the goal function is extended in search, which knows the costbound
+            heur_fn = self.perimeter.heur_fn(heur_fn)
+            #BEGIN TRACING
+            if self.trace:
+                print("   TRACE: Perimeter of depth {} holds {} states".format(self.perimeter_depth, len(self.perimeter)))
+            #END TRACING
+
+        if self.perimeter is not None:
+            #the perimeter replaces heuristic values, which the batch function doesn't know about
+            heur_batch_fn = None
+
+        self.fval_function = fval_function
+        self.goal_fn = goal_fn
+        self.heur_fn = heur_fn
+        self.heur_batch_fn = heur_batch_fn
 
         node = sNode(initState, heur_fn(initState), fval_function)      
+        self.init_node = node
+
+        #drop the cycle check dictionary of an earlier search
+        self.cc_dictionary = None
+
+        if self.strategy in (_IDA_STAR, _RBFS):
+            #memory bounded strategies search from the initial node each time
+            self.open = None
+            return
+
+        self.open = self._new_open()
+
+        #states expanded since the last reweight, and the nodes of closed
+        #states whose gval has improved since (resumable search only)
+        self.closed = set()
+        self.incons = []
 
         #the cycle check dictionary stores the cheapest path (g-val) found
         #so far to a state. 
-        if self.cycle_check == _CC_FULL:
+        if self.cycle_check == _CC_FULL and self.compact_paths:
+            self.cc_dictionary = PathTable()
+            self.cc_dictionary.add(initState.hashable_state(), initState.gval, None, initState.action)
+        elif self.cycle_check == _CC_FULL and self.closed_table:
+            self.cc_dictionary = ClosedTable(ram_budget=self.closed_ram_budget, spill_dir=self.closed_spill_dir)
+            self.cc_dictionary[initState.hashable_state()] = initState.gval
+        elif self.cycle_check == _CC_FULL:
             self.cc_dictionary = dict() 
             self.cc_dictionary[initState.hashable_state()] = initState.gval
         
         self.open.insert(node)
+
+    def _new_open(self):
+        open_impl = self.open_impl
+        if open_impl == _OPEN_AUTO:
+            open_impl = _OPEN_BUCKET if self.integral else _OPEN_HEAP
+        return Open(self.strategy, open_impl)
+
+    def reweight(self, fval_function):
+        '''Continue a resumable search (see set_resumable) under a new
+           fval_function. OPEN is rebuilt from the nodes still on it plus
+           the INCONS list, keeping only the cheapest node found for each
+           state, and keyed on the new fval_function. The closed set is
+           emptied, so only states whose gval improved get expanded again.'''
         self.fval_function = fval_function
-        self.goal_fn = goal_fn
-        self.heur_fn = heur_fn
+        nodes = dict()
+        for node in self.open.nodes() + self.incons:
+            hash_state = node.state.hashable_state()
+            #nodes superseded by a cheaper path to their state are dropped
+            if self.cc_dictionary[hash_state] == node.gval and hash_state not in nodes:
+                node.fval_function = fval_function
+                nodes[hash_state] = node
+        self.open = self._new_open()
+        for node in nodes.values():
+            self.open.insert(node)
+        self.closed = set()
+        self.incons = []
 
     def search(self, timebound=None, costbound=None):
         
@@ -377,27 +1394,129 @@ class SearchEngine:
 
         goal_node = []
 
+        #if the time bound is exceeded, search returns False with
+        #self.timed_out set; the statistics then cover the partial search.
+
+        #self.stats holds the SearchStats of the search when it returns.
+
         ###NOW do the search and return the result
-        self.search_start_time = os.times()[0]
-        self.search_stop_time = None
-        if timebound:
-            self.search_stop_time = self.search_start_time + timebound
-        goal_node = self._searchOpen(self.goal_fn, self.heur_fn, self.fval_function, costbound)
+        self.deadline = Deadline(timebound, self.clock)
+        self.timed_out = False
+        goal_fn = self.goal_fn
+        if self.perimeter is not None:
+            goal_fn = self.perimeter.goal_fn(goal_fn, costbound)
+        if self.strategy == _IDA_STAR:
+            goal_node = self._searchIDA(goal_fn, self.heur_fn, costbound)
+        elif self.strategy == _RBFS:
+            goal_node = self._searchRBFS(goal_fn, self.heur_fn, costbound)
+        elif self.external_dir is not None and self.strategy in (_BREADTH_FIRST, _ASTAR):
+            goal_node = self._searchExternal(goal_fn, self.heur_fn, costbound)
+        elif self.hda_processes and self.strategy in (_ASTAR, _UCS):
+            goal_node = self._searchHDA(goal_fn, self.heur_fn, costbound, timebound)
+        else:
+            goal_node = self._searchOpen(goal_fn, self.heur_fn, self.fval_function, costbound)
+        self.search_time = self.deadline.elapsed()
+        self.stats.search_time = self.search_time
+        self.update_stats()
 
         if goal_node:
-            total_search_time = os.times()[0] - self.search_start_time
+            total_search_time = self.search_time
             #print("Solution Found with cost of {} in search time of {} sec".format(goal_node.gval, total_search_time))
-            #print("Nodes expanded = {}, states generated = {}, states cycle check pruned = {}, states cost bound pruned = {}".format(
-            #    sNode.n, StateSpace.n, self.cycle_check_pruned, self.cost_bound_pruned))
+            #print(self.stats)
+            if self.perimeter is not None:
+                return self.perimeter.complete(goal_node.state)
             return goal_node.state
         else:
             #exited the while without finding goal---search failed
-            total_search_time = os.times()[0] - self.search_start_time            
+            total_search_time = self.search_time
             #print("Search Failed! No solution found.")
-            #print("Nodes expanded = {}, states generated = {}, states cycle check pruned = {}, states cost bound pruned = {}".format(
-            #    sNode.n, StateSpace.n, self.cycle_check_pruned, self.cost_bound_pruned))
+            #print(self.stats)
             return False
 
+    def _searchExternal(self, goal_fn, heur_fn, costbound):
+        """
+        External memory breadth first search or A* (see set_external).
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        init_state = self.init_node.state
+        astar = self.strategy == _ASTAR
+        width = len(init_state.pack())
+        frontier = ExternalFrontier(self.external_dir or None, width, self.external_buffer)
+        try:
+            frontier.add((init_state.gval, self.init_node.hval) if astar else (0, 0), init_state.pack())
+            while True:
+                key = frontier.next_key()
+                if key is None:
+                    return False
+                gval, hval = key
+                for record in _records(frontier.take(key), width):
+                    state = init_state.unpack(record, gval)
+                    if goal_fn(state):
+                        goal_state = self._replay_external(frontier, key, record)
+                        return sNode(goal_state, hval, self.fval_function)
+                    if self._out_of_time():
+                        return False
+                    self.nodes_expanded = self.nodes_expanded + 1
+                    for succ in state.successors():
+                        self.states_generated = self.states_generated + 1
+                        succ_hval = heur_fn(succ)
+                        if self._over_costbound(succ.gval, succ_hval, costbound):
+                            continue
+                        frontier.add((succ.gval, succ_hval) if astar else (gval + 1, 0), succ.pack())
+        finally:
+            frontier.close()
+
+    def _replay_external(self, frontier, key, record):
+        '''Find the path to the state in record, from bucket key, through the
+           expanded buckets of frontier, and return the state with its parents'''
+        init_state = self.init_node.state
+        init_record = init_state.pack()
+        width = frontier.width
+        astar = self.strategy == _ASTAR
+        path = [record]
+        gval = key[0]
+        while record != init_record or gval != (init_state.gval if astar else 0):
+            state = init_state.unpack(record, gval)
+            #a parent is in an expanded bucket with a smaller g, and must
+            #have state as a successor (with gval g, for astar)
+            layers = sorted(((g, layer) for (g, h), paths in frontier.layers.items() if g < gval for layer in paths), reverse=True)
+            if not astar:
+                layers = [(g, layer) for g, layer in layers if g == gval - 1]
+            try:
+                candidates = [pred.pack() for pred in state.predecessors()]
+                in_layer = lambda layer: (r for r in candidates if _find_record(layer, width, r))
+            except Exception:
+                in_layer = lambda layer: _records(layer, width)
+            parent = None
+            for g, layer in layers:
+                for parent_record in in_layer(layer):
+                    if any(succ.pack() == record and (succ.gval == gval or not astar)
+                           for succ in init_state.unpack(parent_record, g).successors()):
+                        parent = (g, parent_record)
+                        break
+                if parent:
+                    break
+            gval, record = parent
+            path.append(record)
+
+        #replay the path from the initial state
+        state = init_state
+        for record in reversed(path[:-1]):
+            state = next(succ for succ in state.successors() if succ.pack() == record)
+        return state
+
+    def _replay_path(self, hash_state):
+        '''Rebuild the state with the given hash, with its parents, by
+           replaying the actions of its path in the PathTable from the initial
+           state'''
+        state = self.init_node.state
+        for action in self.cc_dictionary.actions_to(hash_state):
+            state = next(succ for succ in state.successors() if succ.action == action)
+        return state
+
     def _searchOpen(self, goal_fn, heur_fn, fval_function, costbound):
         """
         Search, starting from self.open.
@@ -407,32 +1526,256 @@ class SearchEngine:
         @param fval_function: the f-value function (only relevant when using a custom search strategy).
         @param costbound: the cost bound 3-tuple, as described in the assignment.
         """
+        #The search loop comes in two versions: _searchOpenFast does no
+        #tracing, profiling or stats callbacks (and doesn't check for them),
+        #_searchOpenTraced does. Both must expand nodes in the same order
+        #(including the batches of a batch heuristic, see _heur_batch).
+        if self.tracer is None and not self.profiling and self.stats_callback is None:
+            goal_node = self._searchOpenFast(goal_fn, heur_fn, costbound)
+        else:
+            goal_node = self._searchOpenTraced(goal_fn, heur_fn, costbound)
+        if goal_node and self.cycle_check == _CC_FULL and self.compact_paths:
+            goal_node.state = self._replay_path(goal_node.state.hashable_state())
+        return goal_node
 
-        #BEGIN TRACING
-        if self.trace:
-            print("   TRACE: Initial OPEN: ", self.open.print_open())
-            if self.cycle_check == _CC_FULL:
-                print("   TRACE: Initial CC_Dict:", self.cc_dictionary)
-        #END TRACING
-        while not self.open.empty():
+    def _heur_batch(self):
+        '''Return the number of successors whose heuristic values are computed
+           together: _HEUR_BATCH with a batch heuristic (see init_search) for
+           the strategies that order OPEN by priority, and 1 otherwise.
+           Depth first and breadth first search must put the successors of a
+           node on OPEN before they extract the next one.'''
+        if self.heur_batch_fn is not None and self.strategy in (_UCS, _BEST_FIRST, _ASTAR, _CUSTOM):
+            return _HEUR_BATCH
+        return 1
+
+    def _searchOpenFast(self, goal_fn, heur_fn, costbound):
+        '''_searchOpen without tracing, profiling or stats callbacks'''
+        open = self.open
+        cc_dictionary = self.cc_dictionary if self.cycle_check == _CC_FULL else None
+        path_check = self.cycle_check == _CC_PATH
+        #depth first search expands along a single path, so path checking
+        #keeps the hashes of the states on it in a set (see _advance_path)
+        #instead of walking the parent pointers of every successor
+        path_set = path_check and self.strategy == _DEPTH_FIRST
+        path, on_path = [], set()
+        resumable = self.resumable
+        closed = self.closed
+        peak_open = self.peak_open
+        compact = cc_dictionary is not None and self.compact_paths
+        heur_batch_fn = self.heur_batch_fn
+        #successors waiting for their heuristic values, as (hash, gval, state,
+        #parent hash, fval_function) tuples. With a batch heuristic they are
+        #collected over several expansions (see _heur_batch), otherwise they
+        #are put on OPEN after each expansion.
+        pending = []
+        batch = self._heur_batch()
+        flush = False
+
+        while True:
+            if pending and (flush or len(pending) >= batch or open.empty()):
+                flush = False
+                #the heuristic is computed once per successor and kept in its node
+                if heur_batch_fn is not None:
+                    hvals = heur_batch_fn([entry[2] for entry in pending])
+                else:
+                    hvals = [heur_fn(entry[2]) for entry in pending]
+
+                for (hash_state, succ_gval, succ, parent_hash, fval_function), succ_hval in zip(pending, hvals):
+                    if costbound is not None and (succ_hval > costbound[1] or
+                                                  succ_gval + succ_hval > costbound[2]):
+                        self.cost_bound_pruned = self.cost_bound_pruned + 1
+                        continue
+
+                    #look the state up again, as a successor of an earlier
+                    #expansion of the batch may have reached it first
+                    old_gval = cc_dictionary.get(hash_state) if cc_dictionary is not None else None
+                    if old_gval is not None and succ_gval > old_gval:
+                        self.cycle_check_pruned = self.cycle_check_pruned + 1
+                        continue
+                    if old_gval is not None and succ_gval < old_gval:
+                        self.reopened = self.reopened + 1
+                    if resumable and hash_state in closed:
+                        if succ_gval == old_gval:
+                            continue
+                        self.incons.append(sNode(succ, succ_hval, fval_function))
+                    else:
+                        open.insert(sNode(succ, succ_hval, fval_function))
+
+                    #record cost of this path in dictionary.
+                    if compact:
+                        cc_dictionary.add(hash_state, succ_gval, parent_hash, succ.action)
+                    elif cc_dictionary is not None:
+                        cc_dictionary[hash_state] = succ_gval
+                pending = []
+
+            if open.empty():
+                break
+            size = len(open.open)
+            if size > peak_open:
+                peak_open = self.peak_open = size
+
+            node = open.extract()
+            state = node.state
+
+            if goal_fn(state):
+                if pending:
+                    #the pending successors might lead to a cheaper goal, so
+                    #put them on OPEN and extract again
+                    open.insert(node)
+                    flush = True
+                    continue
+                #node at front of OPEN is a goal...search is completed.
+                return node
+
+            if self._out_of_time(): #timebound check
+                #exceeded time bound, must terminate search
+                return False
+
+            #only expand the node if no cheaper path to its state has been
+            #found since it was put on OPEN (see _searchOpenTraced)
+            node_hash = state.hashable_state()
+            if cc_dictionary is not None and cc_dictionary[node_hash] < node.gval:
+                continue
+
+            if resumable:
+                #expand each state at most once between reweights
+                if node_hash in closed:
+                    continue
+                closed.add(node_hash)
+
+            self.nodes_expanded = self.nodes_expanded + 1
+            if path_set:
+                _advance_path(path, on_path, state)
+
+            #successors that pass the cycle checks and the g bound
+            for hash_state, succ_gval, candidate in state.successor_candidates():
+                old_gval = cc_dictionary.get(hash_state) if cc_dictionary is not None else None
+                if old_gval is not None and succ_gval > old_gval:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+                if path_set and hash_state in on_path:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+
+                if costbound is not None and succ_gval > costbound[0]:
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    continue
+
+                succ = state.make_successor(candidate)
+                self.states_generated = self.states_generated + 1
+                if compact:
+                    #the path is kept in cc_dictionary (see set_compact_paths)
+                    succ.parent = None
+
+                if path_check and not path_set and succ.has_path_cycle():
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+
+                pending.append((hash_state, succ_gval, succ, node_hash, node.fval_function))
+
+        #end of while--OPEN is empty and no solution
+        return False
+
+    def _searchOpenTraced(self, goal_fn, heur_fn, costbound):
+        '''_searchOpen with tracing, profiling and stats callbacks'''
+        tracer = self.tracer if self.tracer is not None else Tracer()
+        tracer.start(self)
+
+        #profiling: time the phases of the search (see SearchStats)
+        profile = self.profiling
+        stats = self.stats
+        clock = time.perf_counter
+        if profile:
+            heur_fn = _timed(heur_fn, stats, 'time_heuristic')
+        callback = self.stats_callback
+        countdown = self.stats_every
+        #see _searchOpenFast
+        path_set = self.cycle_check == _CC_PATH and self.strategy == _DEPTH_FIRST
+        path, on_path = [], set()
+        compact = self.cycle_check == _CC_FULL and self.compact_paths
+        #see _searchOpenFast
+        heur_batch_fn = self.heur_batch_fn
+        if profile and heur_batch_fn is not None:
+            heur_batch_fn = _timed(heur_batch_fn, stats, 'time_heuristic')
+        pending = []
+        batch = self._heur_batch()
+        flush = False
+
+        while True:
+            if pending and (flush or len(pending) >= batch or self.open.empty()):
+                flush = False
+                #the heuristic is computed once per successor and kept in its node
+                if heur_batch_fn is not None:
+                    hvals = heur_batch_fn([entry[2] for entry in pending])
+                else:
+                    hvals = [heur_fn(entry[2]) for entry in pending]
+
+                for (hash_state, succ_gval, succ, node_hash, fval_function), succ_hval in zip(pending, hvals):
+                    tracer.event('generate', succ, hash_state, succ_gval, succ_hval)
+
+                    if costbound is not None and (succ_hval > costbound[1] or
+                                                  succ_gval + succ_hval > costbound[2]):
+                        self.cost_bound_pruned = self.cost_bound_pruned + 1
+                        tracer.event('prune', succ, hash_state, succ_gval, succ_hval, 'bound')
+                        continue
+
+                    #look the state up again, as a successor of an earlier
+                    #expansion of the batch may have reached it first
+                    if profile: start = clock()
+                    old_gval = self.cc_dictionary.get(hash_state) if self.cycle_check == _CC_FULL else None
+                    if profile: stats.time_hashing += clock() - start
+                    if old_gval is not None and succ_gval > old_gval:
+                        self.cycle_check_pruned = self.cycle_check_pruned + 1
+                        tracer.event('prune', succ, hash_state, succ_gval, succ_hval, 'cycle')
+                        continue
+
+                    #passed all cycle checks and costbound checks ...add to open
+                    #(or to INCONS if the state was already expanded since the
+                    #last reweight, see set_resumable)
+                    if old_gval is not None and succ_gval < old_gval:
+                        self.reopened = self.reopened + 1
+                    if self.resumable and hash_state in self.closed:
+                        if succ_gval == old_gval:
+                            continue
+                        self.incons.append(sNode(succ, succ_hval, fval_function))
+                    else:
+                        if profile: start = clock()
+                        self.open.insert(sNode(succ, succ_hval, fval_function))
+                        if profile: stats.time_queue += clock() - start
+
+                    #record cost of this path in dictionary.
+                    if self.cycle_check == _CC_FULL:
+                        if profile: start = clock()
+                        if compact:
+                            self.cc_dictionary.add(hash_state, succ_gval, node_hash, succ.action)
+                        else:
+                            self.cc_dictionary[hash_state] = succ_gval
+                        if profile: stats.time_hashing += clock() - start
+                pending = []
+
+            if self.open.empty():
+                break
+            size = len(self.open.open)
+            if size > self.peak_open:
+                self.peak_open = size
+
+            if profile: start = clock()
             node = self.open.extract()
+            if profile: stats.time_queue += clock() - start
+            state = node.state
 
-            #BEGIN TRACING
-            if self.trace:
-                print("   TRACE: Next State to expand: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
-                    node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval, node.gval + node.hval))
-                if node.state.gval != node.gval:
-                    print("ERROR: Node gval not equal to state gval!")
-            #END TRACING
-                        
-            if goal_fn(node.state):
-              #node at front of OPEN is a goal...search is completed.
-              return node
+            if goal_fn(state):
+                if pending:
+                    #see _searchOpenFast
+                    self.open.insert(node)
+                    flush = True
+                    continue
+                #node at front of OPEN is a goal...search is completed.
+                tracer.event('goal', state, state.hashable_state(), node.gval, node.hval)
+                return node
 
-            if self.search_stop_time: #timebound check
-              if os.times()[0] > self.search_stop_time:                
+            if self._out_of_time(): #timebound check
                 #exceeded time bound, must terminate search
-                print("TRACE: Search has exceeeded the time bound provided")
                 return False
 
              #All states reached by a search node on OPEN have already
@@ -442,87 +1785,464 @@ class SearchEngine:
              #the node if the hashed g-value is no greater than the
              #node's current g-value. 
 
-            #BEGIN TRACING
-            if self.trace:
-                if self.cycle_check == _CC_FULL: print("   TRACE: CC_dict gval={}, node.gval={}".format(
-                    self.cc_dictionary[node.state.hashable_state()], node.gval))
-            #END TRACING
-
-            if self.cycle_check == _CC_FULL and self.cc_dictionary[node.state.hashable_state()] < node.gval:
+            if profile: start = clock()
+            hash_state = state.hashable_state()
+            stale = self.cycle_check == _CC_FULL and self.cc_dictionary[hash_state] < node.gval
+            if profile: stats.time_hashing += clock() - start
+            if stale:
+                tracer.event('prune', state, hash_state, node.gval, node.hval, 'stale')
                 continue
 
-            successors = node.state.successors()
+            if self.resumable:
+                #expand each state at most once between reweights
+                if hash_state in self.closed:
+                    tracer.event('prune', state, hash_state, node.gval, node.hval, 'closed')
+                    continue
+                self.closed.add(hash_state)
+
+            self.nodes_expanded = self.nodes_expanded + 1
+            tracer.event('expand', state, hash_state, node.gval, node.hval)
+            if callback is not None:
+                #every stats_every expansions (see set_stats_callback)
+                countdown = countdown - 1
+                if countdown <= 0:
+                    callback(self.update_stats())
+                    countdown = self.stats_every
+            node_hash = hash_state
+            if path_set:
+                _advance_path(path, on_path, state)
+
+            #Successors are generated lazily as candidates. Full cycle checking
+            #and the g bound only need the candidate's hash and g-value, so the
+            #successor state is built only once these checks have passed.
+            candidates = state.successor_candidates()
+            if profile:
+                start = clock()
+                candidates = list(candidates)
+                stats.time_successors += clock() - start
+            for hash_state, succ_gval, candidate in candidates:
 
+                if profile: start = clock()
+                old_gval = self.cc_dictionary.get(hash_state) if self.cycle_check == _CC_FULL else None
+                if profile: stats.time_hashing += clock() - start
+
+                if old_gval is not None and succ_gval > old_gval:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    tracer.event('prune', None, hash_state, succ_gval, None, 'cycle')
+                    continue
+                if path_set and hash_state in on_path:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    tracer.event('prune', None, hash_state, succ_gval, None, 'path')
+                    continue
+
+                if costbound is not None and succ_gval > costbound[0]:
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    tracer.event('prune', None, hash_state, succ_gval, None, 'bound')
+                    continue
+
+                if profile: start = clock()
+                succ = state.make_successor(candidate)
+                if profile: stats.time_successors += clock() - start
+                self.states_generated = self.states_generated + 1
+                if compact:
+                    #the path is kept in cc_dictionary (see set_compact_paths)
+                    succ.parent = None
+
+                if self.cycle_check == _CC_PATH and not path_set and succ.has_path_cycle():
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    tracer.event('prune', succ, hash_state, succ_gval, None, 'path')
+                    continue
+
+                pending.append((hash_state, succ_gval, succ, node_hash, node.fval_function))
+
+        #end of while--OPEN is empty and no solution
+        return False
+
+    def _out_of_time(self):
+        '''Return True if the search has exceeded its time bound'''
+        if self.deadline.expired():
+            print("TRACE: Search has exceeeded the time bound provided")
+            self.timed_out = True
+            return True
+        return False
+
+    def _over_costbound(self, gval, hval, costbound):
+        '''Return True (and count the pruning) if a successor violates costbound'''
+        if costbound is not None and (gval > costbound[0] or
+                                      hval > costbound[1] or
+                                      gval + hval > costbound[2]):
+            self.cost_bound_pruned = self.cost_bound_pruned + 1
+            return True
+        return False
+
+    def _searchIDA(self, goal_fn, heur_fn, costbound):
+        """
+        Iterative deepening A*: a sequence of depth first searches from the
+        initial node, each pruning the nodes whose f-value (gval+hval) is
+        above a threshold. The first threshold is the f-value of the initial
+        node, the next is the smallest f-value pruned by the previous
+        iteration. Memory use is the current path plus a transposition table
+        (hashable_state -> gval) of at most self.node_budget states, which
+        prunes states already reached in this iteration at no greater cost.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        root = self.init_node
+        if goal_fn(root.state):
+            return root
+
+        threshold = root.gval + root.hval
+        budget = self.node_budget
+        while True:
             #BEGIN TRACING
             if self.trace:
-                print("   TRACE: Expanding Node. Successors = {", end="")
-                for ss in successors:                  
-                    print("<S{}:{}:{}, g={}, h={}, f=g+h={}>, ".format(
-                        ss.index, ss.action, ss.hashable_state(), ss.gval, heur_fn(ss), ss.gval+heur_fn(ss)), end="")                    
-                print("}")
+                print("   TRACE: IDA* iteration with f-value threshold", threshold)
             #END TRACING
+            next_threshold = float('inf')
+            table = dict()
+            path = {root.state.hashable_state()}
+            stack = [(root, root.state.successor_candidates())]
+            self.nodes_expanded = self.nodes_expanded + 1
+
+            while stack:
+                node, candidates = stack[-1]
+                candidate = next(candidates, None)
+                if candidate is None:
+                    stack.pop()
+                    path.discard(node.state.hashable_state())
+                    continue
+                hash_state, succ_gval, candidate = candidate
 
-            for succ in successors:
-                hash_state = succ.hashable_state()
-                if self.trace > 1: 
-                  if self.cycle_check == _CC_FULL and hash_state in self.cc_dictionary:
-                      print("   TRACE: Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
-                        self.cc_dictionary[hash_state], succ.gval))   
-
-                #BEGIN TRACING
-                if self.trace > 1:
-                    print("   TRACE: Successor State:", end="")
-                    succ.print_state()
-                    print("   TRACE: Heuristic Value:", heur_fn(succ))
-
-                    if self.cycle_check == _CC_FULL and hash_state in self.cc_dictionary:
-                        print("   TRACE: Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
-                            self.cc_dictionary[hash_state], succ.gval))
-
-                    if self.cycle_check == _CC_PATH and succ.has_path_cycle():
-                        print("   TRACE: On cyclic path")
-                #END TRACING
-
-                prune_succ = (self.cycle_check == _CC_FULL and
-                              hash_state in self.cc_dictionary and
-                              succ.gval > self.cc_dictionary[hash_state]
-                             ) or (
-                              self.cycle_check == _CC_PATH and
-                              succ.has_path_cycle()
-                             )
-
-                if prune_succ :
+                if hash_state in path or table.get(hash_state, float('inf')) <= succ_gval:
                     self.cycle_check_pruned = self.cycle_check_pruned + 1
-                    #BEGIN TRACING
-                    if self.trace > 1:
-                        print(" TRACE: Successor State pruned by cycle checking")
-                        print("\n")                        
-                    #END TRACING
+                    continue
+                if costbound is not None and succ_gval > costbound[0]:
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
                     continue
 
+                succ = node.state.make_successor(candidate)
+                self.states_generated = self.states_generated + 1
                 succ_hval = heur_fn(succ)
-                if costbound is not None and (succ.gval > costbound[0] or
-                                              succ_hval > costbound[1] or
-                                              succ.gval + succ_hval > costbound[2]) : 
-                    self.cost_bound_pruned = self.cost_bound_pruned + 1
-                    if self.trace > 1:
-                      print(" TRACE: Successor State pruned, over current cost bound of {}", costbound)
-                      print("\n") 
-                    continue                    
+                if self._over_costbound(succ_gval, succ_hval, costbound):
+                    continue
+                if succ_gval + succ_hval > threshold:
+                    next_threshold = min(next_threshold, succ_gval + succ_hval)
+                    continue
 
-                #passed all cycle checks and costbound checks ...add to open
-                self.open.insert(sNode(succ, succ_hval, node.fval_function))
+                child = sNode(succ, succ_hval, node.fval_function)
+                if goal_fn(succ):
+                    return child
+                if self._out_of_time():
+                    return False
 
-                #BEGIN TRACING
-                if self.trace > 1:
-                    print(" TRACE: Successor State added to OPEN")
-                    print("\n")
-                #END TRACING
+                if budget is None or len(table) < budget or hash_state in table:
+                    table[hash_state] = succ_gval
+                path.add(hash_state)
+                stack.append((child, succ.successor_candidates()))
+                self.nodes_expanded = self.nodes_expanded + 1
 
-                #record cost of this path in dictionary.
-                if self.cycle_check == _CC_FULL:
-                    self.cc_dictionary[hash_state] = succ.gval
+            if next_threshold == float('inf'):
+                #nothing was pruned by the threshold: the search space is exhausted
+                return False
+            threshold = next_threshold
 
-        #end of while--OPEN is empty and no solution
-        return False
+    def _searchRBFS(self, goal_fn, heur_fn, costbound):
+        """
+        Recursive best first search (Korf 1993). Expands nodes in best first
+        (astar) order while only keeping the current path and the siblings
+        of the nodes on it. Each sibling carries a backed up f-value, the
+        best f-value found below it when its subtree was last abandoned.
+        The search gives up if it would hold more than self.node_budget
+        nodes.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        root = self.init_node
+        self.rbfs_nodes = 1
+        self.rbfs_stopped = False
+        goal_node, _ = self._rbfs(root, root.gval + root.hval, float('inf'), {root.state.hashable_state()}, goal_fn, heur_fn, costbound)
+        return goal_node if goal_node else False
+
+    def _rbfs(self, node, fval, f_limit, path, goal_fn, heur_fn, costbound):
+        '''Search below node, whose (backed up) f-value is fval, for a goal
+           with f-value at most f_limit. Returns the goal node (or None) and
+           the new backed up f-value of node.'''
+        if goal_fn(node.state):
+            return node, fval
+        if self._out_of_time():
+            self.rbfs_stopped = True
+            return None, float('inf')
+
+        self.nodes_expanded = self.nodes_expanded + 1
+        #children are [f-value, -gval, counter, node] lists so that sorting
+        #orders them like astar and the f-value can be backed up in place
+        children = []
+        for hash_state, succ_gval, candidate in node.state.successor_candidates():
+            if hash_state in path:
+                self.cycle_check_pruned = self.cycle_check_pruned + 1
+                continue
+            if costbound is not None and succ_gval > costbound[0]:
+                self.cost_bound_pruned = self.cost_bound_pruned + 1
+                continue
+            succ = node.state.make_successor(candidate)
+            self.states_generated = self.states_generated + 1
+            succ_hval = heur_fn(succ)
+            if self._over_costbound(succ_gval, succ_hval, costbound):
+                continue
+            #a child inherits the backed up f-value of a previously abandoned parent
+            children.append([max(succ_gval + succ_hval, fval), -succ_gval, len(children),
+                             sNode(succ, succ_hval, node.fval_function)])
+        if not children:
+            return None, float('inf')
+
+        if self.node_budget is not None and self.rbfs_nodes + len(children) > self.node_budget:
+            print("TRACE: Search has exceeded the node budget provided")
+            self.rbfs_stopped = True
+            return None, float('inf')
+        self.rbfs_nodes = self.rbfs_nodes + len(children)
+
+        try:
+            while True:
+                children.sort()
+                best = children[0]
+                if best[0] > f_limit:
+                    return None, best[0]
+                alternative = children[1][0] if len(children) > 1 else float('inf')
+                hash_state = best[3].state.hashable_state()
+                path.add(hash_state)
+                goal_node, best[0] = self._rbfs(best[3], best[0], min(f_limit, alternative), path, goal_fn, heur_fn, costbound)
+                path.discard(hash_state)
+                if goal_node or self.rbfs_stopped:
+                    return goal_node, best[0]
+        finally:
+            self.rbfs_nodes = self.rbfs_nodes - len(children)
             
+
+    def _searchHDA(self, goal_fn, heur_fn, costbound, timebound):
+        """
+        Hash distributed A* (see set_hda). The search runs in self.hda_processes
+        worker processes (see _hda_worker); this process only starts them, detects
+        termination and puts the solution path back together.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        @param timebound: the time bound, which is wall clock time for HDA*.
+        """
+        n = self.hda_processes
+        #the workers use the CPU time, not this process, so the bound is on elapsed time
+        self.deadline = Deadline(timebound, _CLOCKS['wall'])
+        init_state = self.init_node.state
+        context = multiprocessing.get_context('fork')
+        inboxes = [context.Queue() for _ in range(n)]
+        results = context.Queue()
+        #incumbent: the cost of the cheapest solution found so far, by any worker
+        incumbent = context.Value('d', float('inf'))
+        #sent[w] and received[w] count the batches of states sent and received by
+        #worker w (sent[n] counts the batch holding the initial state), idle[w] is
+        #set while worker w has nothing to expand
+        sent = context.Array('q', n + 1, lock=False)
+        received = context.Array('q', n, lock=False)
+        idle = context.Array('b', n, lock=False)
+        shared = (inboxes, results, incumbent, sent, received, idle)
+
+        workers = [context.Process(target=_hda_worker,
+                                   args=(w, n, self.strategy, goal_fn, heur_fn, costbound, self.hda_batch_size, shared))
+                   for w in range(n)]
+        for worker in workers:
+            worker.start()
+
+        goal_state = None
+        try:
+            init_hash = init_state.hashable_state()
+            sent[n] = 1
+            inboxes[hash(init_hash) % n].put([(init_state, None)])
+
+            #Termination: every worker is idle and every batch sent has been
+            #received, so no states are left to expand nor on their way to a
+            #worker. The counters only ever grow, so if two consecutive snapshots
+            #are equal nothing happened in between, which makes it safe to read
+            #them one at a time.
+            snapshot = None
+            while True:
+                if self._out_of_time():
+                    break
+                _hda_check(workers)
+                previous, snapshot = snapshot, (tuple(idle), tuple(sent), tuple(received))
+                if (previous == snapshot and all(snapshot[0]) and
+                    sum(snapshot[1]) == sum(snapshot[2])):
+                    break
+                time.sleep(0.002)
+
+            #collect the statistics and the best goal of each worker
+            for inbox in inboxes:
+                inbox.put(('report',))
+            goal_hash = None
+            best = float('inf')
+            for _ in range(n):
+                _, stats, gval, hash_state = _hda_get(results, workers)
+                self.nodes_expanded += stats[0]
+                self.states_generated += stats[1]
+                self.cycle_check_pruned += stats[2]
+                self.cost_bound_pruned += stats[3]
+                if hash_state is not None and gval < best:
+                    best, goal_hash = gval, hash_state
+
+            #follow the parent hashes back to the initial state, asking the
+            #owner of each state for it
+            path = []
+            hash_state = goal_hash
+            while hash_state is not None and hash_state != init_hash:
+                inboxes[hash(hash_state) % n].put(('trace', hash_state))
+                _, state, hash_state = _hda_get(results, workers)
+                path.append(state)
+            if path:
+                path.append(init_state)
+                for state, parent in zip(path, path[1:]):
+                    state.parent = parent
+                goal_state = path[0]
+            elif goal_hash is not None:
+                goal_state = init_state
+        finally:
+            for inbox in inboxes:
+                #don't wait at exit for a dead worker to read its inbox
+                inbox.cancel_join_thread()
+                inbox.put(('stop',))
+            for worker in workers:
+                worker.join(1)
+                if worker.is_alive():
+                    worker.terminate()
+
+        return sNode(goal_state, 0, self.fval_function) if goal_state else False
+
+#number of successors whose heuristic values are computed together when
+#there is a batch heuristic (see SearchEngine.init_search)
+_HEUR_BATCH = 256
+
+#number of nodes a HDA* worker expands between looking at its inbox
+_HDA_EXPANSIONS = 100
+
+#seconds the HDA* search waits for a message from its workers before it
+#checks that they are all still running
+_HDA_POLL = 0.1
+
+def _hda_check(workers):
+    '''Raise an exception if one of the HDA* workers has died (e.g., because
+       heur_fn or goal_fn raised an exception in it). The workers only exit
+       when they are told to, so any exit code means one has died.'''
+    for w, worker in enumerate(workers):
+        if worker.exitcode is not None:
+            raise Exception('HDA* worker {} exited with code {}'.format(w, worker.exitcode))
+
+def _hda_get(results, workers):
+    '''Return the next message on the HDA* results queue, checking that the
+       workers are still running while waiting for it'''
+    while True:
+        try:
+            return results.get(timeout=_HDA_POLL)
+        except queue.Empty:
+            _hda_check(workers)
+
+def _hda_worker(w, n, strategy, goal_fn, heur_fn, costbound, batch_size, shared):
+    '''Worker w of n of a hash distributed A* search (see SearchEngine.set_hda).
+       The worker owns the states whose hash is w modulo n: it keeps their
+       cheapest gval in its own cycle check dictionary and their nodes in its
+       own OPEN. Successors owned by other workers are sent to them in batches
+       of (state, parent hash) pairs; states are sent without their parent, and
+       the path to a goal is put back together at the end (see _searchHDA).'''
+    inboxes, results, incumbent, sent, received, idle = shared
+    inbox = inboxes[w]
+    open_nodes = Open(strategy)
+    #hash -> cheapest gval, and hash -> (state, parent hash) of the owned states
+    cc_dictionary = dict()
+    parents = dict()
+    outboxes = [[] for _ in range(n)]
+    stats = [0, 0, 0, 0]    #expanded, generated, cycle check pruned, cost bound pruned
+    goal = (float('inf'), None)
+
+    def add(state, parent_hash):
+        hash_state = state.hashable_state()
+        if hash_state in cc_dictionary and state.gval >= cc_dictionary[hash_state]:
+            stats[2] += 1
+            return
+        hval = heur_fn(state)
+        if (state.gval + hval >= incumbent.value or
+            (costbound is not None and (state.gval > costbound[0] or hval > costbound[1] or
+                                        state.gval + hval > costbound[2]))):
+            stats[3] += 1
+            return
+        cc_dictionary[hash_state] = state.gval
+        parents[hash_state] = (state, parent_hash)
+        open_nodes.insert(sNode(state, hval, None))
+
+    def flush():
+        for owner in range(n):
+            if outboxes[owner]:
+                sent[w] += 1
+                inboxes[owner].put(outboxes[owner])
+                outboxes[owner] = []
+
+    while True:
+        #block only when there is nothing to expand
+        try:
+            message = inbox.get(timeout=0.01) if open_nodes.empty() else inbox.get_nowait()
+        except queue.Empty:
+            message = None
+        if message is not None:
+            if isinstance(message, list):
+                idle[w] = 0
+                received[w] += 1
+                for state, parent_hash in message:
+                    state.parent = None
+                    add(state, parent_hash)
+            elif message[0] == 'trace':
+                state, parent_hash = parents[message[1]]
+                results.put(('trace', state, parent_hash))
+            elif message[0] == 'report':
+                results.put(('report', stats, goal[0], goal[1]))
+            else:
+                return
+            continue
+
+        for _ in range(_HDA_EXPANSIONS):
+            if open_nodes.empty():
+                break
+            node = open_nodes.extract()
+            state = node.state
+            hash_state = state.hashable_state()
+            if cc_dictionary[hash_state] < node.gval:
+                continue
+            if node.gval + node.hval >= incumbent.value:
+                stats[3] += 1
+                continue
+            if goal_fn(state):
+                with incumbent.get_lock():
+                    if node.gval < incumbent.value:
+                        incumbent.value = node.gval
+                if node.gval < goal[0]:
+                    goal = (node.gval, hash_state)
+                continue
+            stats[0] += 1
+            for succ_hash, succ_gval, candidate in state.successor_candidates():
+                owner = hash(succ_hash) % n
+                if owner == w and succ_hash in cc_dictionary and succ_gval >= cc_dictionary[succ_hash]:
+                    stats[2] += 1
+                    continue
+                succ = state.make_successor(candidate)
+                stats[1] += 1
+                succ.parent = None
+                if owner == w:
+                    add(succ, hash_state)
+                else:
+                    outboxes[owner].append((succ, hash_state))
+                    if len(outboxes[owner]) >= batch_size:
+                        sent[w] += 1
+                        inboxes[owner].put(outboxes[owner])
+                        outboxes[owner] = []
+        flush()
+        if open_nodes.empty():
+            idle[w] = 1
@@ -1,10 +1,26 @@
 """Snowball routines.
 
-    A) Class SnowmanState
+    A) Class SnowmanBoard
+
+    The static part of a puzzle (dimensions, obstacles and destination) together with a
+    precomputed neighbor table. It is shared by all states of the same puzzle.
+
+    B) Class SnowmanPatternDatabase
+
+    Exact costs of moving a single snowball to the destination, for every placement of the
+    snowball and the robot, computed once per board. Used by the pattern database heuristics.
+
+    C) Class SnowmanState
 
     A specializion of the StateSpace Class that is tailored to the game of Snowball.
+    States are stored packed: the robot's cell index plus a sorted tuple of snowballs.
 
-    B) class Direction
+    D) Class SnowmanPushState
+
+    A SnowmanState for push level search: every action is a walk followed by a push, and
+    states are identified by their snowballs and the region the robot can walk to.
+
+    E) class Direction
 
     An encoding of the directions of movement that are possible for robots in Snowball.
 
@@ -12,11 +28,321 @@
 """
 
 from search import *
+import random
+import os
+import hashlib
+import struct
+from array import array
+
+#distance stored for cells or placements from which the destination can't be reached.
+UNREACHABLE = 0xFFFF
+
+#records of external memory search (see SnowmanState.pack): the robot's cell and up to 3 packed
+#snowballs, unused entries set to _NO_BALL.
+_RECORD = struct.Struct('>4H')
+_NO_BALL = 0xFFFF
+
+class SnowmanBoard:
+
+    # the static part of a Snowman Puzzle: everything that does not change as the robot moves.
+    # A single board object is shared by every SnowmanState generated for the same puzzle so that
+    # search nodes only need to store the robot and the snowballs.
+
+    # cells are numbered row by row, i.e., the cell of location (x, y) is y * width + x.
+
+    _boards = {}
+
+    def __init__(self, width, height, obstacles, destination):
+        self.width = width
+        self.height = height
+        self.obstacles = obstacles
+        self.destination = destination
+        self.size = width * height
+        self.dest_cell = self.cell(destination)
+
+        #coords: the (x, y) location of each cell.
+        self.coords = tuple((c % width, c // width) for c in range(self.size))
+
+        #neighbors: for each cell, the cell reached by moving UP, RIGHT, DOWN and LEFT (in that order).
+        #The entry is -1 if the move leaves the board or runs into an obstacle.
+        neighbors = []
+        for location in self.coords:
+            row = []
+            for direction in DIRECTIONS:
+                new_location = direction.move(location)
+                if (new_location[0] < 0 or new_location[0] >= width or
+                    new_location[1] < 0 or new_location[1] >= height or
+                    new_location in obstacles):
+                    row.append(-1)
+                else:
+                    row.append(self.cell(new_location))
+            neighbors.append(tuple(row))
+        self.neighbors = tuple(neighbors)
+
+        #Zobrist keys: a random 64 bit key for the robot on each cell and for each packed snowball
+        #(cell << 3 | size). A state's hash is the XOR of the keys of its robot and snowballs, so
+        #it can be updated incrementally when a move changes only a few of them. The generator is
+        #seeded so that hashes are the same across runs and processes.
+        rng = random.Random(_ZOBRIST_SEED)
+        self.robot_keys = tuple(rng.getrandbits(64) for _ in range(self.size))
+        self.ball_keys = tuple(rng.getrandbits(64) for _ in range(self.size << _SIZE_BITS))
+
+        #perimeters around the goal, by depth (see SnowmanState.perimeter)
+        self.perimeters = {}
+
+        #push_distance: for each cell, the least number of pushes that bring a snowball on that
+        #cell to the destination (UNREACHABLE if there are none), taking obstacles into account.
+        #dead_mask: bit c is set if a snowball on cell c can never be pushed to the destination.
+        self.push_distance = self._push_distances()
+        self.dead_mask = 0
+        for c in range(self.size):
+            if self.push_distance[c] == UNREACHABLE:
+                self.dead_mask |= 1 << c
+
+        #built on demand by pattern_database()
+        self._pattern_database = None
+
+    def _push_distances(self):
+        '''Breadth first search over snowball positions, backwards from the destination.
+           A snowball only moves when the robot pushes it from the opposite side, so a
+           snowball could have come to cell y moving in direction d from the cell x before
+           y if the robot could stand on the cell before x. The other snowballs and the
+           robot's path to its standing cell are ignored, so the distances never
+           overestimate. Cells never reached are dead.'''
+        neighbors = self.neighbors
+        dist = array('H', [UNREACHABLE]) * self.size
+        dist[self.dest_cell] = 0
+        queue = [self.dest_cell]
+        for y in queue:
+            for d in range(4):
+                x = neighbors[y][(d + 2) % 4]
+                if x >= 0 and dist[x] == UNREACHABLE and neighbors[x][(d + 2) % 4] >= 0:
+                    dist[x] = dist[y] + 1
+                    queue.append(x)
+        return dist
+
+    def is_dead(self, cell):
+        '''Return True if a snowball on cell can never reach the destination'''
+        return (self.dead_mask >> cell) & 1 == 1
+
+    def __reduce__(self):
+        #boards are pickled as their description, and unpickled as the shared board
+        #of the receiving process, so pickled states stay small
+        return (SnowmanBoard.get, (self.width, self.height, self.obstacles, self.destination))
+
+    @classmethod
+    def get(cls, width, height, obstacles, destination):
+        '''Return the shared board for these dimensions, obstacles and destination'''
+        key = (width, height, frozenset(obstacles), destination)
+        board = cls._boards.get(key)
+        if board is None:
+            board = cls(width, height, key[2], destination)
+            cls._boards[key] = board
+        return board
+
+    def cell(self, location):
+        '''Return the cell index of an (x, y) location'''
+        return location[1] * self.width + location[0]
+
+    def zobrist(self, robot_cell, balls):
+        '''Compute the Zobrist hash of a packed state from scratch'''
+        h = self.robot_keys[robot_cell]
+        for ball in balls:
+            h ^= self.ball_keys[ball]
+        return h
+
+    def key(self):
+        '''Return a string that identifies the board across runs (used to name files)'''
+        description = repr((self.width, self.height, sorted(self.obstacles), self.destination))
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def pattern_database(self, cache_dir=None):
+        '''Return the SnowmanPatternDatabase of this board. It is built once per board; if
+           cache_dir is given it is also loaded from (or saved to) a file in that directory.'''
+        pdb = self._pattern_database
+        if pdb is None:
+            path = os.path.join(cache_dir, self.key() + '.pdb') if cache_dir else None
+            if path and os.path.exists(path):
+                pdb = SnowmanPatternDatabase.load(self, path)
+            else:
+                pdb = SnowmanPatternDatabase(self)
+                if path:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    pdb.save(path)
+            self._pattern_database = pdb
+        return pdb
+
+
+class SnowmanPatternDatabase:
+
+    # a pattern database for a board: the exact cost of the abstracted problem that keeps the
+    # robot and a single snowball (of any size) and removes all other snowballs, for every
+    # placement of the two. The abstract goal is the snowball on the destination.
+
+    # abstract moves are the robot walking, the robot pushing the snowball (both move one cell),
+    # and the snowball sliding one cell away from a robot that does not move. The last one is how
+    # the top of a stack moves when the stack is pushed apart, and it makes every real move a
+    # legal abstract move, so abstract costs never overestimate real ones.
+
+    # distances are stored in a flat array of unsigned shorts indexed by ball_cell * size + robot_cell.
+
+    UNREACHABLE = UNREACHABLE
+
+    def __init__(self, board, dist=None):
+        self.board = board
+        self.dist = dist if dist is not None else self._build()
+
+    def _build(self):
+        '''Breadth first search backwards from the abstract goal states'''
+        board = self.board
+        size = board.size
+        neighbors = board.neighbors
+        dist = array('H', [self.UNREACHABLE]) * (size * size)
+
+        queue = []
+        for robot_cell in range(size):
+            if robot_cell != board.dest_cell and board.coords[robot_cell] not in board.obstacles:
+                dist[board.dest_cell * size + robot_cell] = 0
+                queue.append((board.dest_cell, robot_cell))
+
+        for ball_cell, robot_cell in queue:
+            d_next = dist[ball_cell * size + robot_cell] + 1
+            preds = []
+            for d in range(4):
+                back = (d + 2) % 4
+                #the robot walked in direction d
+                prev = neighbors[robot_cell][back]
+                if prev >= 0 and prev != ball_cell:
+                    preds.append((ball_cell, prev))
+                #the robot pushed the snowball in direction d (and stands where it was)
+                if neighbors[ball_cell][back] == robot_cell and neighbors[robot_cell][back] >= 0:
+                    preds.append((robot_cell, neighbors[robot_cell][back]))
+                #the snowball slid in direction d from the cell between it and the robot
+                middle = neighbors[robot_cell][d]
+                if middle >= 0 and neighbors[middle][d] == ball_cell:
+                    preds.append((middle, robot_cell))
+            for pred in preds:
+                i = pred[0] * size + pred[1]
+                if dist[i] == self.UNREACHABLE:
+                    dist[i] = d_next
+                    queue.append(pred)
+        return dist
+
+    def distance(self, ball_cell, robot_cell):
+        '''Abstract cost of bringing a snowball on ball_cell to the destination with the
+           robot starting on robot_cell (UNREACHABLE if it can't be done)'''
+        return self.dist[ball_cell * self.board.size + robot_cell]
+
+    def max_heuristic(self, state):
+        '''Admissible: the largest abstract cost over the snowballs of state'''
+        dist = self.dist
+        offset = state.robot_cell
+        size = self.board.size
+        return max(dist[(ball >> _SIZE_BITS) * size + offset] for ball in state.balls)
+
+    def sum_heuristic(self, state):
+        '''Additive: the sum of the abstract costs of the snowballs of state. Robot moves are
+           counted once per snowball, so this may overestimate; use it for greedy searches.'''
+        dist = self.dist
+        offset = state.robot_cell
+        size = self.board.size
+        return sum(dist[(ball >> _SIZE_BITS) * size + offset] for ball in state.balls)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            self.dist.tofile(f)
+
+    @classmethod
+    def load(cls, board, path):
+        dist = array('H')
+        with open(path, 'rb') as f:
+            dist.fromfile(f, board.size * board.size)
+        return cls(board, dist)
+
+
+#snowball sizes: 'b' is 'big', 'm' is 'medium' and 's' is small.
+#A type 'G' snowman is a complete snowman.
+#A type 'A' snowman is formed by placing a medium snowball atop big one.
+#A type 'B' snowman is formed by placing a small snowball atop medium one.
+#A type 'C' snowman is formed by placing a small snowball atop big one.
+SNOWBALL_SIZES = {0: 'b', 1: 'm', 2: 's', 3: 'A', 4: 'B', 5: 'C', 6: 'G'}
+
+#result of pushing a snowball (second index) onto another one (first index).
+_STACKS = {(0, 1): 3, (1, 2): 4, (0, 2): 5, (3, 2): 6}
+
+#result of pushing a stack apart: (size left behind, size pushed forward).
+_SPLITS = {3: (0, 1), 4: (1, 2), 5: (0, 2)}
+
+#the inverses, used to generate predecessors.
+_UNSTACKS = {stacked: pair for pair, stacked in _STACKS.items()}
+_UNSPLITS = {pair: size for size, pair in _SPLITS.items()}
+
+#snowballs are packed as cell << _SIZE_BITS | size and kept in a sorted tuple.
+_SIZE_BITS = 3
+_SIZE_MASK = (1 << _SIZE_BITS) - 1
+
+_ZOBRIST_SEED = 384
+
+
+def _push(board, balls, occupied, h, robot_cell, d, new_cell, size):
+    '''The robot on robot_cell pushes the snowball (or stack) of the given size on the
+       neighboring new_cell in direction d. occupied maps the cells of balls to their sizes
+       and h is the Zobrist hash of balls (without the robot). Returns the robot's new cell,
+       the new balls and their hash, or None if the push is illegal or deadlocks the state.'''
+    ball_keys = board.ball_keys
+    ball_cell = board.neighbors[new_cell][d]
+    if ball_cell < 0 or size == 6: #can't push off the board, into obstacles, or move a complete Snowman
+        return None
+    if (board.dead_mask >> ball_cell) & 1: #the pushed snowball could never leave ball_cell
+        return None
+
+    pushed = new_cell << _SIZE_BITS | size
+    rest = [ball for ball in balls if (ball >> _SIZE_BITS) != new_cell and (ball >> _SIZE_BITS) != ball_cell]
+    target = occupied.get(ball_cell)
+    if target is not None:
+        #cases where a smaller snowball is pushed atop a bigger one
+        stacked = _STACKS.get((target, size))
+        if stacked is None or (stacked == 6 and ball_cell != board.dest_cell):
+            return None
+        added = ball_cell << _SIZE_BITS | stacked
+        rest.append(added)
+        new_robot = new_cell
+        new_h = h ^ ball_keys[pushed] ^ ball_keys[ball_cell << _SIZE_BITS | target] ^ ball_keys[added]
+    elif size in _SPLITS:
+        #cases where a stack of snowballs is pushed apart; the robot does not move
+        bottom, top = _SPLITS[size]
+        left = new_cell << _SIZE_BITS | bottom
+        added = ball_cell << _SIZE_BITS | top
+        rest.append(left)
+        rest.append(added)
+        new_robot = robot_cell
+        new_h = h ^ ball_keys[pushed] ^ ball_keys[left] ^ ball_keys[added]
+    else:
+        #case robot has pushed one snowball
+        added = ball_cell << _SIZE_BITS | size
+        rest.append(added)
+        new_robot = new_cell
+        new_h = h ^ ball_keys[pushed] ^ ball_keys[added]
+
+    rest.sort()
+    return new_robot, tuple(rest), new_h
+
 
 class SnowmanState(StateSpace):
     
     # a StateSpace with additional key attributes
 
+    #board: the SnowmanBoard shared by all states of the puzzle.
+    #robot_cell: the cell index of the robot.
+    #balls: sorted tuple of packed snowballs (cell << 3 | size).
+    #zobrist: the cached Zobrist hash of (robot_cell, balls).
+    __slots__ = ('board', 'robot_cell', 'balls', 'zobrist')
+
+    snowball_sizes = SNOWBALL_SIZES
+
+    #every move costs the same
+    transition_cost = 1
+
     def __init__(self, action, gval, parent, width, height, robot, snowballs, obstacles, destination):
         
         #width: the width of the Snowman Puzzle board
@@ -35,110 +361,181 @@ class SnowmanState(StateSpace):
 
 
         StateSpace.__init__(self, action, gval, parent)
-        self.width = width
-        self.height = height
-        self.robot = robot
-        self.destination = destination        
-        self.snowballs = snowballs
-        self.obstacles = obstacles
-        
-        #snowball sizes: 'b' is 'big', 'm' is 'medium' and 's' is small.  
-        #A type 'G' snowman is a complete snowman.
-        #A type 'A' snowman is formed by placing a medium snowball atop big one.
-        #A type 'B' snowman is formed by placing a small snowball atop medium one.
-        #A type 'C' snowman is formed by placing a small snowball atop big one.
-        self.snowball_sizes = {0: 'b', 1: 'm', 2: 's', 3: 'A', 4: 'B', 5: 'C', 6: 'G'} 
+        board = SnowmanBoard.get(width, height, obstacles, destination)
+        self.board = board
+        self.robot_cell = board.cell(robot)
+        self.balls = tuple(sorted(board.cell(snowball) << _SIZE_BITS | size for snowball, size in snowballs.items()))
+        self.zobrist = board.zobrist(self.robot_cell, self.balls)
+
+    @classmethod
+    def from_packed(cls, action, gval, parent, board, robot_cell, balls, zobrist):
+        '''Create a state directly from its packed representation (used when generating successors)'''
+        state = cls.__new__(cls)
+        StateSpace.__init__(state, action, gval, parent)
+        state.board = board
+        state.robot_cell = robot_cell
+        state.balls = balls
+        state.zobrist = zobrist
+        return state
+
+    #the unpacked view of the state, as used by heuristics and printing.
+    @property
+    def width(self): return self.board.width
+
+    @property
+    def height(self): return self.board.height
+
+    @property
+    def obstacles(self): return self.board.obstacles
+
+    @property
+    def destination(self): return self.board.destination
+
+    @property
+    def robot(self): return self.board.coords[self.robot_cell]
+
+    @property
+    def snowballs(self):
+        coords = self.board.coords
+        return {coords[ball >> _SIZE_BITS]: ball & _SIZE_MASK for ball in self.balls}
+
+    def deadlocked(self):
+        '''Return True if a snowball is on a dead cell or a snowman was completed away from the
+           destination. No goal can be reached from a deadlocked state.'''
+        board = self.board
+        for ball in self.balls:
+            if (board.dead_mask >> (ball >> _SIZE_BITS)) & 1 or ((ball & _SIZE_MASK) == 6 and (ball >> _SIZE_BITS) != board.dest_cell):
+                return True
+        return False
+
+    def push_distance(self):
+        '''Return the sum over the snowballs of their push distances to the destination
+           (see SnowmanBoard.push_distance). Every move moves at most one snowball by one
+           cell, so this never overestimates the cost to the goal.'''
+        push_distance = self.board.push_distance
+        return sum(push_distance[ball >> _SIZE_BITS] for ball in self.balls)
+
+    def moves(self):
+        '''Generate the legal moves from this state as (action, robot_cell, balls, zobrist) tuples
+           without building any states. The hash is updated incrementally from this state's.
+           Pushes that deadlock the state (see deadlocked) are not generated.'''
+        board = self.board
+        neighbors = board.neighbors
+        robot_keys = board.robot_keys
+        robot_cell = self.robot_cell
+        balls = self.balls
+        h = self.zobrist ^ robot_keys[robot_cell]
+        occupied = {ball >> _SIZE_BITS: ball & _SIZE_MASK for ball in balls}
+
+        for d, new_cell in enumerate(neighbors[robot_cell]):
+            if new_cell < 0:
+                continue
+
+            size = occupied.get(new_cell)
+            if size is None: #robot moves onto a free cell
+                yield DIRECTIONS[d].name, new_cell, balls, h ^ robot_keys[new_cell]
+                continue
 
+            #the robot pushes the snowball (or stack) at new_cell
+            push = _push(board, balls, occupied, h, robot_cell, d, new_cell, size)
+            if push is not None:
+                new_robot, new_balls, new_h = push
+                yield DIRECTIONS[d].name, new_robot, new_balls, new_h ^ robot_keys[new_robot]
 
     def successors(self):
         
         #This function generates a list of SnowmanStates that are successors to a given SnowmanState. Each state will be annotated by the action that was used to arrive at the SnowmanState up, down, left, right.
         
-        successors = []
-        transition_cost = 1
-
-        for direction in (UP, RIGHT, DOWN, LEFT):
-
-            new_location = direction.move(self.robot)
-            
-            #if the new location is outside of bounds, skip
-            if new_location[0] < 0 or new_location[0] >= self.width:
-                continue
-            if new_location[1] < 0 or new_location[1] >= self.height:
-                continue
-            if new_location in self.obstacles:
-                continue
-            
-            new_snowballs = dict(self.snowballs)
-            index = 0
-
-            if new_location in self.snowballs: #if the location we're going to is where there's a snowball
-                new_snowball_location = direction.move(new_location) #move the snowball
-                
-                #snowball out of bounds?
-                if new_snowball_location[0] < 0 or new_snowball_location[0] >= self.width:
-                    continue
-                if new_snowball_location[1] < 0 or new_snowball_location[1] >= self.height:
-                    continue
-                if new_snowball_location in self.obstacles:
-                    continue        
-                if self.snowball_sizes[new_snowballs[new_location]] == 'G': #can't move a complete Snowman       
-                    continue  
-
-                #cases where bigger snowball is pushed atop smaller one(s)        
-                if new_snowball_location in new_snowballs: #if the new snowball location is where there's a snowball
-                    if self.snowball_sizes[new_snowballs[new_snowball_location]] == 'b' and self.snowball_sizes[new_snowballs[new_location]] == 'm':
-                        index = 3 #will transition to A formation of snowballs
-                    elif self.snowball_sizes[new_snowballs[new_snowball_location]] == 'm' and self.snowball_sizes[new_snowballs[new_location]] == 's':
-                        index = 4 #will transition to B formation of snowballs
-                    elif self.snowball_sizes[new_snowballs[new_snowball_location]] == 'b' and self.snowball_sizes[new_snowballs[new_location]] == 's':
-                        index = 5  #will transition to C formation of snowballs 
-                    elif self.snowball_sizes[new_snowballs[new_snowball_location]] == 'A' and self.snowball_sizes[new_snowballs[new_location]] == 's':
-                        index = 6  #will transition to Goal formation of snowballs               
-                    else:
-                        continue
-
-                #cases where a stack of snowballs is pushed apart                             
-                if self.snowball_sizes[new_snowballs[new_location]] == 'A':
-                    new_snowballs[new_location] = 0 #b
-                    new_snowballs[new_snowball_location] = 1 #m  
-                    index = 7;                 
-                if self.snowball_sizes[new_snowballs[new_location]] == 'B':
-                    new_snowballs[new_location] = 1 #m
-                    new_snowballs[new_snowball_location] = 2 #s     
-                    index = 7;   
-                if self.snowball_sizes[new_snowballs[new_location]] == 'C':
-                    new_snowballs[new_location] = 0 #b
-                    new_snowballs[new_snowball_location] = 2 #s 
-                    index = 7;               
-
-                if index == 0: #case robot has pushed one snowball
-                    index = new_snowballs.pop(new_location)
-                elif index != 7: #case robot has pushed snowballs stack apart          
-                    new_snowballs.pop(new_location)
-                    new_snowballs.pop(new_snowball_location)
-                
-                if index < 7: #case robot has pushed two snowballs together
-                    new_snowballs[new_snowball_location] = index
-            
-            if index == 7: #if robot pushed snowball stack apart, no movement of robot results
-                new_robot = self.robot
-            else:
-                new_robot = tuple(new_location)
-
-            new_state = SnowmanState(action=direction.name, gval=self.gval + transition_cost, parent=self,
-                                     width=self.width, height=self.height, robot=new_robot,
-                                     snowballs=new_snowballs, obstacles=self.obstacles, destination=self.destination)
-            successors.append(new_state)
-
-        return successors
+        gval = self.gval + self.transition_cost
+        board = self.board
+        return [SnowmanState.from_packed(action, gval, self, board, robot_cell, balls, zobrist)
+                for action, robot_cell, balls, zobrist in self.moves()]
+
+    def successor_candidates(self):
+        #The candidates are the move tuples themselves; they already carry the successor's hash.
+        gval = self.gval + self.transition_cost
+        for move in self.moves():
+            yield move[3], gval, move
+
+    def make_successor(self, move):
+        action, robot_cell, balls, zobrist = move
+        return SnowmanState.from_packed(action, self.gval + self.transition_cost, self, self.board, robot_cell, balls, zobrist)
+
+    def goal_states(self):
+        #A goal has a complete snowman on the destination. The robot can be on any other free cell.
+        board = self.board
+        balls = (board.dest_cell << _SIZE_BITS | 6,)
+        goals = []
+        for robot_cell in range(board.size):
+            if robot_cell != board.dest_cell and board.coords[robot_cell] not in board.obstacles:
+                goals.append(SnowmanState.from_packed("GOAL", 0, None, board, robot_cell, balls, board.zobrist(robot_cell, balls)))
+        return goals
+
+    def predecessors(self):
+        #Undo each kind of move that can lead to this state. d is the direction of the undone move,
+        #back the cell the robot came from and ahead the cell in front of the robot.
+        board = self.board
+        neighbors = board.neighbors
+        robot_cell = self.robot_cell
+        balls = self.balls
+        occupied = {ball >> _SIZE_BITS: ball & _SIZE_MASK for ball in balls}
+        preds = []
+
+        def pred(action, new_robot, removed, added):
+            new_balls = tuple(sorted([ball for ball in balls if ball not in removed] + added))
+            preds.append(SnowmanState.from_packed(action, 0, None, board, new_robot, new_balls, board.zobrist(new_robot, new_balls)))
+
+        for d in range(4):
+            action = DIRECTIONS[d].name
+            back = neighbors[robot_cell][(d + 2) % 4]
+            ahead = neighbors[robot_cell][d]
+            size = occupied.get(ahead) if ahead >= 0 else None
+
+            if back >= 0 and back not in occupied:
+                #the robot walked from back
+                pred(action, back, (), [])
+                if size is not None:
+                    ball = ahead << _SIZE_BITS | size
+                    if size < 3:
+                        #the robot pushed the snowball from its cell to ahead
+                        pred(action, back, (ball,), [robot_cell << _SIZE_BITS | size])
+                    elif size in _UNSTACKS:
+                        #the robot pushed a snowball from its cell onto the one ahead
+                        bottom, top = _UNSTACKS[size]
+                        pred(action, back, (ball,), [ahead << _SIZE_BITS | bottom, robot_cell << _SIZE_BITS | top])
+
+            if size is not None:
+                #the robot pushed apart a stack that was ahead
+                beyond = neighbors[ahead][d]
+                stack = _UNSPLITS.get((size, occupied.get(beyond))) if beyond >= 0 else None
+                if stack is not None:
+                    pred(action, robot_cell, (ahead << _SIZE_BITS | size, beyond << _SIZE_BITS | occupied[beyond]), [ahead << _SIZE_BITS | stack])
+
+        return preds
+
+    def perimeter(self, depth):
+        #perimeters only depend on the board, so they are built once and kept there
+        perimeters = self.board.perimeters
+        if depth not in perimeters:
+            perimeters[depth] = Perimeter(self.goal_states(), depth)
+        return perimeters[depth]
+
+    def pack(self):
+        #the robot's cell and the packed snowballs, padded to 3 (cells must be below 8192).
+        return _RECORD.pack(self.robot_cell, *(self.balls + (_NO_BALL,) * (3 - len(self.balls))))
+
+    def unpack(self, record, gval):
+        robot_cell, *balls = _RECORD.unpack(record)
+        balls = tuple(ball for ball in balls if ball != _NO_BALL)
+        return SnowmanState.from_packed(None, gval, None, self.board, robot_cell, balls, self.board.zobrist(robot_cell, balls))
 
     def hashable_state(self):
         
         #This is a function that calculates a unique index to represents a particular SnowmanState. It is used to facilitate path and cycle checking.
 
 
-        return hash((self.robot, frozenset(self.snowballs.items())))
+        #The Zobrist hash is maintained incrementally by moves(), so this is just a lookup.
+        return self.zobrist
 
 
     def state_string(self):
@@ -192,6 +589,130 @@ class SnowmanState(StateSpace):
         print(self.state_string())
 
 
+class SnowmanPushState(SnowmanState):
+
+    # a SnowmanState for push level (macro move) search. Each action walks the robot to a cell
+    # next to a snowball and pushes it once, so states where the robot just walks around are never
+    # generated. The cost of an action is the length of the walk plus 1, and its name lists every
+    # step, e.g. "up left left push right".
+
+    # states are identified by their snowballs and the region the robot can walk to (represented
+    # by the smallest cell in it) rather than by the robot's cell. Two states whose robot stands on
+    # different cells of the same region are treated as the same state by cycle checking; the first
+    # one found is kept, so solutions are valid but need not be optimal.
+
+    #region_cell: the smallest cell reachable by the robot without pushing.
+    __slots__ = ('region_cell',)
+
+    #an action costs the length of its walk plus 1
+    unit_costs = False
+
+    def __init__(self, action, gval, parent, width, height, robot, snowballs, obstacles, destination):
+        SnowmanState.__init__(self, action, gval, parent, width, height, robot, snowballs, obstacles, destination)
+        board = self.board
+        self.region_cell = min(self.walks()[0])
+        self.zobrist = board.zobrist(self.region_cell, self.balls)
+
+    @classmethod
+    def from_state(cls, state):
+        '''Create the push level state for a SnowmanState (e.g., one of the test PROBLEMS)'''
+        return cls(state.action, state.gval, None, state.width, state.height, state.robot,
+                   state.snowballs, state.obstacles, state.destination)
+
+    def walks(self, robot_cell=None, balls=None):
+        '''Breadth first search for the cells the robot can walk to from robot_cell (by default
+           its own cell) without pushing any of balls (by default this state's). Returns a dict
+           mapping each reachable cell to its distance and a dict mapping each reachable cell
+           but the first to the direction of the last step on a shortest walk to it.'''
+        if robot_cell is None:
+            robot_cell = self.robot_cell
+            balls = self.balls
+        neighbors = self.board.neighbors
+        occupied = {ball >> _SIZE_BITS for ball in balls}
+        dist = {robot_cell: 0}
+        steps = {}
+        queue = [robot_cell]
+        for cell in queue:
+            for d, next_cell in enumerate(neighbors[cell]):
+                if next_cell >= 0 and next_cell not in dist and next_cell not in occupied:
+                    dist[next_cell] = dist[cell] + 1
+                    steps[next_cell] = d
+                    queue.append(next_cell)
+        return dist, steps
+
+    def push_moves(self):
+        '''Generate the pushes available from this state as (zobrist, gval, move) triples where
+           move is (walk_steps, stand_cell, d, robot_cell, balls, region_cell, zobrist)'''
+        board = self.board
+        neighbors = board.neighbors
+        balls = self.balls
+        occupied = {ball >> _SIZE_BITS: ball & _SIZE_MASK for ball in balls}
+        h = self.zobrist ^ board.robot_keys[self.region_cell]
+        dist, steps = self.walks()
+
+        for ball in balls:
+            ball_cell = ball >> _SIZE_BITS
+            for d in range(4):
+                stand = neighbors[ball_cell][(d + 2) % 4]
+                if stand not in dist:
+                    continue
+                push = _push(board, balls, occupied, h, stand, d, ball_cell, ball & _SIZE_MASK)
+                if push is None:
+                    continue
+                new_robot, new_balls, new_h = push
+                region_cell = min(self.walks(new_robot, new_balls)[0])
+                new_h = new_h ^ board.robot_keys[region_cell]
+                gval = self.gval + (dist[stand] + 1) * self.transition_cost
+                yield new_h, gval, (steps, stand, d, new_robot, new_balls, region_cell, new_h)
+
+    def successors(self):
+        return [self.make_successor(move) for _, _, move in self.push_moves()]
+
+    def successor_candidates(self):
+        return self.push_moves()
+
+    def make_successor(self, move):
+        steps, stand, d, robot_cell, balls, region_cell, zobrist = move
+        #walk back from the standing cell to recover the robot's path
+        neighbors = self.board.neighbors
+        path = []
+        cell = stand
+        while cell != self.robot_cell:
+            step = steps[cell]
+            path.append(DIRECTIONS[step].name)
+            cell = neighbors[cell][(step + 2) % 4]
+        path.reverse()
+        path.append("push " + DIRECTIONS[d].name)
+
+        state = SnowmanPushState.__new__(SnowmanPushState)
+        StateSpace.__init__(state, " ".join(path), self.gval + len(path) * self.transition_cost, self)
+        state.board = self.board
+        state.robot_cell = robot_cell
+        state.balls = balls
+        state.region_cell = region_cell
+        state.zobrist = zobrist
+        return state
+
+    #perimeter search builds single step states hashed by the robot's cell, so it isn't available at
+    #the push level (the hooks inherited from SnowmanState would silently mix the two kinds of states).
+    def goal_states(self):
+        raise Exception("Perimeter search is not supported by SnowmanPushState.")
+
+    def predecessors(self):
+        raise Exception("Perimeter search is not supported by SnowmanPushState.")
+
+    def perimeter(self, depth):
+        raise Exception("Perimeter search is not supported by SnowmanPushState.")
+
+    #records are identified by the robot's cell, and a push state's gval depends on where in its region
+    #the robot stands, so a push state can't be rebuilt from a record of its region cell either.
+    def pack(self):
+        raise Exception("External memory search is not supported by SnowmanPushState.")
+
+    def unpack(self, record, gval):
+        raise Exception("External memory search is not supported by SnowmanPushState.")
+
+
 def removekey(d, key):    
     r = dict(d)
     del r[key]
@@ -204,10 +725,8 @@ def snowman_goal_state(state):
   @param state: a Snowball state
   OUTPUT: True (if goal) or False (if not)
   """
-  for snowball in state.snowballs:
-    if(state.snowball_sizes[state.snowballs[snowball]] == 'G' and snowball[1] == state.destination[1] and snowball[0] == state.destination[0]): #means a complete snowman is on the board and in the right spot
-        return True
-  return False 
+  #means a complete snowman is on the board and in the right spot
+  return (state.board.dest_cell << _SIZE_BITS | 6) in state.balls
 
 def generate_coordinate_rect(x_start, x_finish, y_start, y_finish):
     """
@@ -266,6 +785,9 @@ RIGHT = Direction("right", (1, 0))
 DOWN = Direction("down", (0, 1))
 LEFT = Direction("left", (-1, 0))
 
+#Directions in the order used by SnowmanBoard.neighbors
+DIRECTIONS = (UP, RIGHT, DOWN, LEFT)
+
 
 
   
@@ -15,6 +15,8 @@ from test_problems import PROBLEMS #20 test problems
 import math
 import numpy as np
 import time
+import multiprocessing
+import queue
 # (approx. 10 lines)
 def heur_manhattan_distance(state):
 #IMPLEMENT
@@ -36,6 +38,15 @@ def heur_manhattan_distance(state):
 
     return m_distance
 
+def heur_push_distance(state):
+    '''admissible snowman heuristic: obstacle aware push distance'''
+    '''INPUT: a snowman state'''
+    '''OUTPUT: a numeric value that serves as an estimate of the distance of the state to the goal.'''
+    #Like heur_manhattan_distance, but each snowball's distance is the least number of pushes that bring it to the goal
+    #around the obstacles, with the robot able to stand behind it for every push.
+    #The distances are precomputed once per board (SnowmanBoard.push_distance), so this is a table lookup per snowball.
+    return state.push_distance()
+
 #HEURISTICS 
 def trivial_heuristic(state):
   '''trivial admissible snowball heuristic'''
@@ -57,112 +68,86 @@ def heur_alternate(state):
     PENALTY = 1000 # penalization weight
     
     # IDEA: since creating a new heuristic based on rewarding the best past results in worse runtimes, the approach below will penalize bad moves instead
-    # This includes: deadlocks on edges, corners, and times when the order of snowballs is disrupted on the goal 'b' -> 'm' -> 's'
-
-    # following are indicators to see if the goal is on an edge
-    # otherwise we want to avoid edges to prevent deadlocks
-    left_edge = False
-    right_edge = False
-    top_edge = False
-    bottom_edge = False
-
-    boardX = state.width
-    boardY = state.height
-
-    robot = state.robot
-    goal = state.destination
-    obstacles = state.obstacles
+    # A state is penalized when it is deadlocked: a snowball sits on a cell from which it can never be pushed to the goal
+    # (corners, and edges or walls that the goal is not along) or a snowman was completed somewhere else.
+    # The dead cells are precomputed once per board (SnowmanBoard.dead_mask), so this check is one lookup per snowball.
+    # (successors() never pushes a snowball onto a dead cell, so this mostly matters for the initial state)
+    if state.deadlocked():
+        return PENALTY
 
-    cost = [] # find the cost representing the closes snowball to the robot (no need to accumilate all costs)
-
-    # cost2 = [] 
-    # loop through each existing snowball for the deadlock states
-    
-    # The goal is to penalize deadlock states which can come in two forms:
-    # 1. Going to an edge of a wall or obstacle that has no goal
-    # 2. Going to a corner with no goal
     # Additionally, we want to enforce shortest paths to the nearest snowball, so we calculate the manhattan
     # distance between the robot to each snowball, take the minimum, and add it to the overall manhattan distance for cost
     # It was found that adding total manhattan cost to the path cost to the nearest snowall solves the most problems
+    robot = state.robot
+    cost = [abs(robot[0] - snowball[0]) + abs(robot[1] - snowball[1]) for snowball in state.snowballs]
+
+    return heur_manhattan_distance(state) + min(cost)
+
+# Batch versions of the heuristics for SearchEngine.init_search(heur_batch_fn=...). The search collects the successors
+# of several expansions (a few hundred states) per call, which is enough to outweigh numpy's per call overhead.
+
+#numpy tables of the boards seen by the batch heuristics below: the x and y coordinates and the dead flag of each cell
+_batch_tables = {}
+
+def _batch_table(board):
+    table = _batch_tables.get(board)
+    if table is None:
+        xs = np.array([coord[0] for coord in board.coords])
+        ys = np.array([coord[1] for coord in board.coords])
+        dead = np.array([(board.dead_mask >> cell) & 1 for cell in range(board.size)], dtype=bool)
+        table = _batch_tables[board] = (xs, ys, dead)
+    return table
+
+def _batch_balls(states):
+    # the packed snowballs of the states as an (n, 3) array of cells and sizes, padded with the destination cell
+    # (at distance 0) and size 0 for states with fewer than 3 snowball cells
+    board = states[0].board
+    balls = np.full((len(states), 3), -1)
+    for i, state in enumerate(states):
+        balls[i, :len(state.balls)] = state.balls
+    valid = balls >= 0
+    cells = np.where(valid, balls >> 3, board.dest_cell)
+    sizes = np.where(valid, balls & 7, 0)
+    return cells, sizes, valid
+
+def heur_manhattan_distance_batch(states):
+    '''heur_manhattan_distance of a list of states of the same board, vectorized with numpy (see SearchEngine.init_search)'''
+    board = states[0].board
+    xs, ys, dead = _batch_table(board)
+    cells, sizes, valid = _batch_balls(states)
+    distance = np.abs(xs[cells] - xs[board.dest_cell]) + np.abs(ys[cells] - ys[board.dest_cell])
+    return distance.sum(axis=1).tolist()
+
+def heur_alternate_batch(states):
+    '''heur_alternate of a list of states of the same board, vectorized with numpy (see SearchEngine.init_search)'''
+    PENALTY = 1000
+    board = states[0].board
+    xs, ys, dead = _batch_table(board)
+    cells, sizes, valid = _batch_balls(states)
+    distance = np.abs(xs[cells] - xs[board.dest_cell]) + np.abs(ys[cells] - ys[board.dest_cell])
+
+    # the same deadlock test as SnowmanState.deadlocked, for all the snowballs at once
+    deadlocked = (valid & (dead[cells] | ((sizes == 6) & (cells != board.dest_cell)))).any(axis=1)
+
+    # the manhattan distance of the robot to its nearest snowball, ignoring the padding
+    robots = np.array([state.robot_cell for state in states])[:, None]
+    robot_distance = np.abs(xs[cells] - xs[robots]) + np.abs(ys[cells] - ys[robots])
+    nearest = np.where(valid, robot_distance, board.size).min(axis=1)
+
+    return np.where(deadlocked, PENALTY, distance.sum(axis=1) + nearest).tolist()
+
+def heur_pattern_database(state):
+    '''admissible pattern database heuristic'''
+    '''INPUT: a snowman state'''
+    '''OUTPUT: the largest cost, over the snowballs, of bringing that snowball alone to the goal from the robot's position'''
+    # the table is built once per board (see SnowmanBoard.pattern_database), so this is a lookup per snowball
+    return state.board.pattern_database().max_heuristic(state)
 
-    for snowball in state.snowballs:
-        cost.append(abs(robot[0] - snowball[0]) + abs(robot[1] - snowball[1]))
-        # cost2.append(abs(snowball[0] - goal[0]) + abs(snowball[1] - goal[1]))
-       
-        if snowball[0] == goal[0]:
-            continue
-        
-        if snowball[0] == boardX - 1:
-            right_edge = True
-        if snowball[0] == 0:
-            left_edge = True
-        if snowball[1] == 0:
-            top_edge = True
-        if snowball[1] == boardY - 1:
-            bottom_edge = True
-
-        # corner checks
-        if boardX >= 7 and boardY >= 7:
-            if not right_edge and not top_edge:
-                if snowball[0] == boardX - 1 and snowball[1] == 0:
-                    return PENALTY
-
-            elif not right_edge and not bottom_edge:
-                if snowball[0] == boardX - 1 and snowball[1] == boardY - 1:
-                    return PENALTY
-
-            elif not left_edge and not top_edge:
-                if snowball[0] == 0 and snowball[1] == 0:
-                    return PENALTY
-
-            elif not left_edge and not bottom_edge:
-                if snowball[0] == 0 and snowball[1] == boardY - 1:
-                    return PENALTY
-        
-        # check against obstacles
-        # top right
-        if boardX < 7 and boardY < 7:
-            if ((snowball[0] + 1, snowball[1]) or right_edge) in obstacles and ((snowball[0], snowball[1] + 1) in obstacles or top_edge) and goal[0] != snowball[0]:
-                return PENALTY
-            # top left
-            if ((snowball[0] - 1, snowball[1]) or left_edge) in obstacles and ((snowball[0], snowball[1] + 1) in obstacles or top_edge) and goal[0] != snowball[0]:
-                return PENALTY
-            # bottom right
-            if ((snowball[0], snowball[1] + 1) or bottom_edge) in obstacles and ((snowball[0] + 1, snowball[1]) in obstacles or right_edge) and goal[1] != snowball[1]:
-                return PENALTY
-            # bottom left
-            if ((snowball[0], snowball[1] + 1) or bottom_edge) in obstacles and ((snowball[0] - 1, snowball[1]) in obstacles or left_edge) and goal[1] != snowball[1]:
-                return PENALTY
-        
-        
-        # edge checks
-        if right_edge and goal[0] != snowball[0]:
-            return PENALTY
-
-        elif bottom_edge and goal[1] != snowball[1]:
-            return PENALTY
-
-        elif left_edge and goal[0] != snowball[0]:
-            return PENALTY
-
-        elif top_edge and goal[1] != snowball[1]:
-            return PENALTY
-        
-        # tried below, but did not improve runtime
-        '''
-        if (robot[0] - 1, robot[1]) == snowball and (robot[0] - 2, robot[1]) in state.snowballs and ((robot[0] - 2, robot[1]) in obstacles or (robot[0] - 2) == -1):
-            return PENALTY
-        elif (robot[0] + 1, robot[1]) == snowball and (robot[0] + 2, robot[1]) in state.snowballs and ((robot[0] + 2, robot[1]) in obstacles or (robot[0] + 2) == boardX):
-            return PENALTY
-        elif (robot[0], robot[1] - 1) == snowball and (robot[0], robot[1] - 2) in state.snowballs and ((robot[0], robot[1] - 2) in obstacles or (robot[1] - 2) == -1):
-            return PENALTY
-        elif (robot[0], robot[1] + 1) == snowball and (robot[0], robot[1] + 2) in state.snowballs and ((robot[0], robot[1] + 2) in obstacles or (robot[1] + 2) == boardY):
-            return PENALTY
-        '''
-    
-    mini = min(cost)
-    # mini2 = min(cost2)
-    return heur_manhattan_distance(state) + mini # + mini2
+def heur_pattern_database_sum(state):
+    '''additive pattern database heuristic (not admissible, for best first searches)'''
+    '''INPUT: a snowman state'''
+    '''OUTPUT: the sum, over the snowballs, of the cost of bringing that snowball alone to the goal from the robot's position'''
+    return state.board.pattern_database().sum_heuristic(state)
 
 def heur_zero(state):
     '''Zero Heuristic can be used to make A* search perform uniform cost search'''
@@ -188,21 +173,50 @@ def fval_function(sN, weight):
     #You must initialize your search engine object as a 'custom' search engine if you supply a custom fval function.
     return sN.gval + sN.hval*weight
 
+class SharedCostBound:
+    '''A costbound 3-tuple (see SearchEngine.search) whose g bound is the cost of the best
+       solution found so far by any process of a portfolio (see anytime_portfolio). The bound
+       lives in shared memory and is read every time the search engine checks it, so every
+       process prunes with the current best cost.'''
+
+    def __init__(self, value=None, solutions=None):
+        # value: a multiprocessing.Value('d') shared by the processes
+        # solutions: an optional multiprocessing.Queue that receives every improving goal state
+        self.value = value if value is not None else multiprocessing.Value('d', float('inf'))
+        self.solutions = solutions
+
+    def __getitem__(self, i):
+        return self.value.value if i == 0 else float('inf')
+
+    def update(self, state):
+        '''Lower the bound to the gval of the goal state if that improves it'''
+        with self.value.get_lock():
+            if state.gval < self.value.value:
+                self.value.value = state.gval
+                if self.solutions is not None:
+                    self.solutions.put(state)
+
 # (approx. 20 lines)
-def anytime_weighted_astar(initial_state, heur_fn, weight=25, timebound = 5):
+def anytime_weighted_astar(initial_state, heur_fn, weight=25, timebound = 5, weight_decrement = 0.05, incumbent = None, clock = 'cpu'):
 #IMPLEMENT
     '''Provides an implementation of anytime weighted a-star, as described in the HW1 handout'''
     '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
     '''OUTPUT: A goal state (if a goal is found), else False'''
     '''implementation of weighted astar algorithm'''
+    # weight_decrement: how much the weight is lowered after each solution
+    # incumbent: an optional SharedCostBound to prune with (and report solutions to) when running in a portfolio
+    # clock: what timebound measures, 'cpu' or 'wall' (see SearchEngine.set_clock)
     # initialize searching engine from the given API
-    start = os.times()[0]
     fval_fct = (lambda sN : fval_function(sN, weight))
     engine = SearchEngine('custom', 'full')
+    engine.set_clock(clock)
+    start = engine.clock()
+    # keep OPEN between weights so each weight only does the extra work (ARA*)
+    engine.set_resumable()
     engine.init_search(initial_state, snowman_goal_state, heur_fn, fval_fct)
 
     elapsed = 0
-    costbound = (float('inf'), float('inf'), float('inf'))
+    costbound = (float('inf'), float('inf'), float('inf')) if incumbent is None else incumbent
     goal_state = False
     w = weight
 
@@ -212,52 +226,112 @@ def anytime_weighted_astar(initial_state, heur_fn, weight=25, timebound = 5):
         
         if found_state: 
             # for costbound we only consider the gvalues
-            end = os.times()[0]
+            end = engine.clock()
             elapsed = end - start
-            costbound = (found_state.gval, float('inf'), float('inf'))
+            if incumbent is None:
+                costbound = (found_state.gval, float('inf'), float('inf'))
+            else:
+                incumbent.update(found_state)
             # update the next best goal state
             goal_state = found_state 
         else:
             return goal_state
         
-        # decrement the weight
-        w -= 0.05
+        # decrement the weight and continue the search from where it stopped
+        w -= weight_decrement
         fval_fct = (lambda sN : fval_function(sN, w))
-        engine.init_search(initial_state, snowman_goal_state, heur_fn, fval_fct)
+        engine.reweight(fval_fct)
 
     return goal_state
 
 # (approx. 20 lines) implement before anytime_weighted_astar
-def anytime_gbfs(initial_state, heur_fn, timebound = 5):
+def anytime_gbfs(initial_state, heur_fn, timebound = 5, incumbent = None, clock = 'cpu'):
 #IMPLEMENT
     '''Provides an implementation of anytime greedy best-first search, as described in the HW1 handout'''
     '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
     '''OUTPUT: A goal state (if a goal is found), else False'''
     '''implementation of weighted astar algorithm'''
+    # incumbent: an optional SharedCostBound to prune with (and report solutions to) when running in a portfolio
+    # clock: what timebound measures, 'cpu' or 'wall' (see SearchEngine.set_clock)
     # initialize searching engine from the given API
     engine = SearchEngine('best_first', 'full')
+    engine.set_clock(clock)
     engine.init_search(initial_state, snowman_goal_state, heur_fn)
     
     # The algorithm returns either when we have expanded all non-pruned nodes OR when it runs out of time.
     # create a costbound variable to allow for pruning (begin with inf cost so any gval is better at first)
-    costbound = (float('inf'), float('inf'), float('inf'))
+    costbound = (float('inf'), float('inf'), float('inf')) if incumbent is None else incumbent
     goal_state = False
     # measure time elapsed so far
     elapsed = 0
 
-    start = time.time()
+    start = engine.clock()
     while elapsed < timebound - 3:
         # time remaining for the search will be timebound - elapsed      
         found_state = engine.search(timebound - elapsed, costbound)
-        end = time.time()
+        end = engine.clock()
         elapsed = end - start
 
         if found_state: 
             # for costbound we only consider the gvalues
-            costbound = (found_state.gval, float('inf'), float('inf'))
+            if incumbent is None:
+                costbound = (found_state.gval, float('inf'), float('inf'))
+            else:
+                incumbent.update(found_state)
             # update the next best goal state
             goal_state = found_state 
         else:
             return goal_state
 
     return goal_state
+
+# the shared bound of the portfolio, set in each worker process by _init_portfolio_worker
+_portfolio_incumbent = None
+
+def _init_portfolio_worker(value, solutions):
+    global _portfolio_incumbent
+    _portfolio_incumbent = SharedCostBound(value, solutions)
+
+def _run_portfolio_member(member, initial_state, heur_fn, timebound):
+    '''Run one member of the portfolio: ('gbfs',) or ('weighted_astar', weight, weight_decrement)'''
+    if member[0] == 'gbfs':
+        return anytime_gbfs(initial_state, heur_fn, timebound, incumbent=_portfolio_incumbent)
+    return anytime_weighted_astar(initial_state, heur_fn, member[1], timebound,
+                                  weight_decrement=member[2], incumbent=_portfolio_incumbent)
+
+def anytime_portfolio(initial_state, heur_fn, timebound = 5, schedules = ((25, 0.05), (10, 0.5), (5, 1)), processes = None):
+    '''Runs anytime_gbfs and anytime_weighted_astar with several weight schedules at the same time'''
+    '''INPUT: a snowman state that represents the start state, a heuristic (a module level function, so it can be sent to
+       the worker processes), a timebound (number of seconds) and the (initial weight, weight decrement) schedules'''
+    '''OUTPUT: The cheapest goal state found by any of them (if a goal is found), else False'''
+    # The members run in a process pool and share the cost of the best solution found so far through shared memory:
+    # every member prunes with it (see SharedCostBound), so a good solution found by one speeds up all the others.
+    start = time.monotonic()
+    members = [('gbfs',)] + [('weighted_astar', weight, decrement) for weight, decrement in schedules]
+    value = multiprocessing.Value('d', float('inf'))
+    solutions = multiprocessing.Queue()
+    # leave a little time for starting the workers and collecting the results
+    member_timebound = max(timebound - 0.5, 0.1)
+
+    goal_state = False
+    pool = multiprocessing.Pool(processes or len(members), initializer=_init_portfolio_worker, initargs=(value, solutions))
+    try:
+        results = [pool.apply_async(_run_portfolio_member, (member, initial_state, heur_fn, member_timebound))
+                   for member in members]
+        # members report each improving solution as they find it, so nothing is lost if they are still running at the deadline
+        found_states = []
+        while time.monotonic() - start < timebound:
+            try:
+                found_states.append(solutions.get(timeout=min(0.05, max(timebound - (time.monotonic() - start), 0.001))))
+            except queue.Empty:
+                if all(result.ready() for result in results):
+                    found_states.extend(result.get() for result in results)
+                    break
+        for found_state in found_states:
+            if found_state and (not goal_state or found_state.gval < goal_state.gval):
+                goal_state = found_state
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return goal_state